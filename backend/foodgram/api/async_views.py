@@ -0,0 +1,165 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage
+from recipes.models import Recipes
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from users.models import User
+
+from .authentication import CachedTokenAuthentication
+from .relations import get_user_relations
+from .views import (IngredientsViewSet, RecipesViewSet, download_shopping_cart,
+                    shopping_list_response)
+
+recipe_list_view = RecipesViewSet.as_view(
+    {'get': 'list', 'post': 'create'}, basename='recipe', detail=False)
+recipe_detail_view = RecipesViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'}, basename='recipe', detail=True)
+ingredient_list_view = IngredientsViewSet.as_view(
+    {'get': 'list'}, basename='ingredient', detail=False)
+
+
+class FallbackError(Exception):
+    """Запрос обслуживает синхронное представление."""
+
+
+def with_fallback(sync_view):
+    """Асинхронное представление с запасным синхронным.
+
+    Если корутина бросает FallbackError или ошибку API (401, 400, 404),
+    запрос целиком уходит sync_view через sync_to_async, как любое
+    синхронное представление под ASGI: так запись, редкие режимы и
+    ответы с ошибками не расходятся с WSGI.
+    """
+    fallback = sync_to_async(sync_view)
+
+    def decorator(handler):
+        @functools.wraps(sync_view)
+        async def view(request, *args, **kwargs):
+            if request.method == 'GET':
+                try:
+                    return await handler(request, *args, **kwargs)
+                except (FallbackError, APIException):
+                    pass
+            return await fallback(request, *args, **kwargs)
+        return view
+    return decorator
+
+
+async def prepare(sync_view, request, kwargs=None):
+    """Представление DRF и Request без dispatch().
+
+    Экземпляр собирается, как в as_view() синхронного представления.
+    Пользователь берётся через CachedTokenAuthentication.aauthenticate(),
+    права и формат ответа проверяются как в APIView.initial().
+    """
+    view = sync_view.cls(**sync_view.initkwargs)
+    actions = getattr(sync_view, 'actions', None)
+    if actions:
+        view.action_map = actions
+        for method, action in actions.items():
+            setattr(view, method, getattr(view, action))
+        if hasattr(view, 'get') and not hasattr(view, 'head'):
+            view.head = view.get
+    view.args, view.kwargs = (), kwargs or {}
+    view.format_kwarg = None
+    view.headers = view.default_response_headers
+    drf_request = view.request = view.initialize_request(request)
+    credentials = None
+    if view.authentication_classes:
+        credentials = await CachedTokenAuthentication().aauthenticate(
+            request)
+    drf_request.user, drf_request.auth = credentials or (AnonymousUser(), None)
+    view.check_permissions(drf_request)
+    drf_request.accepted_renderer, drf_request.accepted_media_type = (
+        view.perform_content_negotiation(drf_request))
+    return view, drf_request
+
+
+async def prepare_json(sync_view, request, kwargs=None):
+    view, drf_request = await prepare(sync_view, request, kwargs)
+    # Browsable API рендерит формы с запросами к БД.
+    if not isinstance(drf_request.accepted_renderer, JSONRenderer):
+        raise FallbackError
+    return view, drf_request
+
+
+async def filter_queryset(view):
+    queryset = view.get_queryset()
+    if not view.request.query_params:
+        return queryset
+    # Фильтры могут читать справочники из БД (tag_ids_by_slug).
+    return await sync_to_async(view.filter_queryset)(queryset)
+
+
+def finalize(view, drf_request, response):
+    response = view.finalize_response(drf_request, response)
+    return response.render()
+
+
+@with_fallback(recipe_list_view)
+async def recipe_list(request):
+    view, drf_request = await prepare_json(recipe_list_view, request)
+    paginator = view.paginator
+    if (paginator.use_cursor(drf_request)
+            or drf_request.query_params.get('search', '').strip()):
+        raise FallbackError
+    queryset = await filter_queryset(view)
+    django_paginator = paginator.django_paginator_class(
+        queryset, paginator.get_page_size(drf_request))
+    django_paginator.count = await queryset.acount()
+    try:
+        page = django_paginator.page(
+            paginator.get_page_number(drf_request, django_paginator))
+    except InvalidPage:
+        raise FallbackError
+    # Асинхронный обход выполняет и prefetch_related.
+    page.object_list = [recipe async for recipe in page.object_list]
+    paginator.page, paginator.request = page, drf_request
+    await get_user_relations(drf_request).aload()
+    serializer = view.get_serializer(page.object_list, many=True)
+    return finalize(
+        view, drf_request, paginator.get_paginated_response(serializer.data))
+
+
+@with_fallback(recipe_detail_view)
+async def recipe_detail(request, pk):
+    view, drf_request = await prepare_json(
+        recipe_detail_view, request, {'pk': pk})
+    queryset = await filter_queryset(view)
+    try:
+        recipe = await queryset.aget(pk=pk)
+    except Recipes.DoesNotExist:
+        raise FallbackError
+    view.check_object_permissions(drf_request, recipe)
+    await get_user_relations(drf_request).aload()
+    return finalize(
+        view, drf_request, Response(view.get_serializer(recipe).data))
+
+
+@with_fallback(ingredient_list_view)
+async def ingredient_list(request):
+    """Ответ из кеша справочников; при промахе поиск и запись в кеш
+    выполняет синхронное представление."""
+    view, drf_request = await prepare(ingredient_list_view, request)
+    response = await view.acached_response(request)
+    if response is None:
+        raise FallbackError
+    return response
+
+
+@with_fallback(download_shopping_cart)
+async def shopping_list(request):
+    """Список покупок потоком из aiterator(): память не зависит от
+    длины списка."""
+    view, drf_request = await prepare(download_shopping_cart, request)
+    cart_version = await User.objects.values_list(
+        'cart_version', flat=True).aget(pk=drf_request.user.pk)
+    response = shopping_list_response(
+        drf_request, drf_request.accepted_renderer, cart_version,
+        asynchronous=True)
+    return view.finalize_response(drf_request, response)
@@ -0,0 +1,143 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from users.models import User
+
+# Поля пользователя, которые хранятся в кешах. Пароль и счётчики туда не
+# попадают: у экземпляра из кеша они отложены (deferred) и читаются из
+# БД при обращении, а save() пишет только загруженные поля.
+CACHED_USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+class LRUCache:
+    """Ограниченный по размеру кеш в памяти процесса с TTL записей."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(
+    settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def _cache_key(token):
+    # Сам токен в ключ не попадает.
+    return f'auth:token:{hashlib.sha256(token.encode()).hexdigest()}'
+
+
+def get_shared_cache():
+    alias = settings.AUTH_TOKEN_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def forget_tokens(tokens):
+    """Убирает токены из кешей; вызывается сигналами (api/signals.py)."""
+    keys = [_cache_key(token) for token in tokens]
+    for key in keys:
+        local_cache.delete(key)
+    shared = get_shared_cache()
+    if shared is not None and keys:
+        shared.delete_many(keys)
+
+
+def _loaded_fields():
+    # from_db ждёт значения в порядке полей модели.
+    return [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in CACHED_USER_FIELDS
+    ]
+
+
+def cached_user(values):
+    """Пользователь из значений CACHED_USER_FIELDS; остальные поля
+    отложены."""
+    fields = _loaded_fields()
+    return User.from_db('default', fields, [values[name] for name in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД на каждый вызов.
+
+    Поля CACHED_USER_FIELDS пользователя по токену кешируются в LRU
+    процесса, а если задан AUTH_TOKEN_CACHE_ALIAS - ещё и в общем кеше.
+    Записи сбрасываются при удалении токена (logout djoser) и при
+    сохранении пользователя, но LRU других процессов узнаёт об этом
+    только по истечении AUTH_TOKEN_CACHE_TTL. Пароль и счётчики в кеш
+    не попадают: они читаются из БД при первом обращении, а полный
+    save() такого пользователя их не перезаписывает.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        values = local_cache.get(cache_key)
+        shared = get_shared_cache()
+        if values is None and shared is not None:
+            values = shared.get(cache_key)
+            if values is not None:
+                local_cache.set(cache_key, values)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            values = {name: getattr(user, name) for name in _loaded_fields()}
+            local_cache.set(cache_key, values)
+            if shared is not None:
+                shared.set(cache_key, values, settings.AUTH_TOKEN_CACHE_TTL)
+            return user, token
+        return self.cached_credentials(key, values)
+
+    def cached_credentials(self, key, values):
+        user = cached_user(values)
+        return user, self.get_model()(key=key, user=user)
+
+    async def aauthenticate(self, request):
+        """authenticate() для асинхронных представлений.
+
+        Попадание в LRU процесса обходится без потока и БД; промах и
+        ошибки заголовка обрабатывает authenticate() через sync_to_async.
+        """
+        auth = get_authorization_header(request).split()
+        if len(auth) == 2 and auth[0].lower() == self.keyword.lower().encode():
+            key = auth[1].decode(errors='replace')
+            values = local_cache.get(_cache_key(key))
+            if values is not None:
+                return self.cached_credentials(key, values)
+        return await sync_to_async(self.authenticate)(request)
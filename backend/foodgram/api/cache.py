@@ -0,0 +1,185 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from recipes.models import Tags
+
+STATS_KEYS = ('hits', 'misses')
+
+
+def get_cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def is_process_local():
+    """Кеш справочников и счётчиков виден только этому процессу."""
+    return isinstance(get_cache(), LocMemCache)
+
+
+def timeouts():
+    """Сроки хранения (версии, ответа) в кеше справочников.
+
+    Сигнал меняет версию только в кеше того процесса, который обработал
+    запись. Если кеш не общий (LocMemCache), другие процессы узнают об
+    изменении, когда истечёт версия, поэтому и версия, и ответы хранятся
+    не дольше REFERENCE_CACHE_MAX_AGE.
+    """
+    if is_process_local():
+        max_age = min(
+            settings.REFERENCE_CACHE_MAX_AGE, settings.REFERENCE_CACHE_TIMEOUT)
+        return max_age, max_age
+    return None, settings.REFERENCE_CACHE_TIMEOUT
+
+
+def _version_key(resource):
+    return f'reference:{resource}:version'
+
+
+def get_version(resource):
+    cache = get_cache()
+    version = cache.get(_version_key(resource))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(_version_key(resource), version, timeouts()[0]):
+            return cache.get(_version_key(resource), version)
+    return version
+
+
+async def aget_version(resource):
+    """get_version() для асинхронных представлений."""
+    cache = get_cache()
+    version = await cache.aget(_version_key(resource))
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await cache.aadd(
+                _version_key(resource), version, timeouts()[0]):
+            return await cache.aget(_version_key(resource), version)
+    return version
+
+
+def bump_version(resource):
+    """Делает недействительными все закешированные ответы ресурса."""
+    get_cache().set(
+        _version_key(resource), uuid.uuid4().hex, timeouts()[0])
+
+
+def tag_ids_by_slug(slugs=()):
+    """{slug: id} всех тегов; кешируется до изменения тегов.
+
+    Если среди slugs есть незнакомые кешу, карта перечитывается из БД:
+    тег мог появиться в другом процессе, до которого смена версии
+    ещё не дошла.
+    """
+    cache = get_cache()
+    key = f'reference:tags:{get_version("tags")}:ids'
+    mapping = cache.get(key)
+    if mapping is None or not mapping.keys() >= set(slugs):
+        mapping = dict(Tags.objects.values_list('slug', 'id'))
+        cache.set(key, mapping, timeouts()[1])
+    return mapping
+
+
+def _count(resource, outcome):
+    cache = get_cache()
+    key = f'reference:{resource}:{outcome}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+async def _acount(resource, outcome):
+    cache = get_cache()
+    key = f'reference:{resource}:{outcome}'
+    await cache.aadd(key, 0, None)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        pass
+
+
+def cache_stats(resources):
+    """Попадания и промахи кеша по ресурсам: {ресурс: {hits, misses}}."""
+    cache = get_cache()
+    return {
+        resource: {
+            outcome: cache.get(f'reference:{resource}:{outcome}', 0)
+            for outcome in STATS_KEYS
+        }
+        for resource in resources
+    }
+
+
+class CachedReadOnlyMixin:
+    """Кеширует готовые ответы GET-запросов справочных ViewSet.
+
+    Ключ строится из пути, параметров запроса и заголовка Accept,
+    а версия ресурса меняется сигналами при изменении моделей (см.
+    api/signals.py). Ответ сопровождается ETag и Cache-Control, поэтому
+    клиенты и nginx могут перепроверять его запросом с If-None-Match.
+    Отдача из кеша идёт в обход аутентификации, поэтому миксин годится
+    только для публичных данных.
+    """
+    cache_resource = None
+
+    def get_response_cache_key(self, request, version=None):
+        params = sorted(request.GET.lists())
+        raw = f'{request.path}|{params}|{request.META.get("HTTP_ACCEPT")}'
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        version = version or get_version(self.cache_resource)
+        return f'reference:{self.cache_resource}:{version}:{digest}'
+
+    def finalize_cached_response(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.REFERENCE_CACHE_MAX_AGE)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def cached_response(self, request, cached):
+        content, content_type, etag = cached
+        response = get_conditional_response(
+            request, etag=etag,
+            response=HttpResponse(content, content_type=content_type))
+        response['X-Cache'] = 'HIT'
+        return self.finalize_cached_response(response, etag)
+
+    async def acached_response(self, request):
+        """Ответ из кеша для асинхронного представления или None."""
+        key = self.get_response_cache_key(
+            request, await aget_version(self.cache_resource))
+        cached = await get_cache().aget(key)
+        if cached is None:
+            return None
+        await _acount(self.cache_resource, 'hits')
+        return self.cached_response(request, cached)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        cache = get_cache()
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            _count(self.cache_resource, 'hits')
+            return self.cached_response(request, cached)
+        _count(self.cache_resource, 'misses')
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        response.render()
+        etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+        cache.set(
+            key, (response.content, response['Content-Type'], etag),
+            timeouts()[1]
+        )
+        response = get_conditional_response(
+            request, etag=etag, response=response)
+        response['X-Cache'] = 'MISS'
+        return self.finalize_cached_response(response, etag)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .cache import is_process_local
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    """Счётчики /metrics живут в кеше: с LocMemCache каждый процесс
+    считает своё, и /metrics показывает один случайный процесс."""
+    if settings.PROFILING_SAMPLE_RATE and is_process_local():
+        return [Warning(
+            'Счётчики /metrics хранятся в LocMemCache и видны только '
+            'процессу, который обслужил запрос.',
+            hint='Задайте общий CACHE_BACKEND (Redis, Memcached) или '
+                 'PROFILING_SAMPLE_RATE=0.',
+            id='api.W001',
+        )]
+    return []
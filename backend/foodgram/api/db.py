@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import caches
+
+# Счётчик новых соединений для /metrics: (ключ, имя метрики, описание).
+# Соединения, закрытые проверкой CONN_HEALTH_CHECKS, Django не
+# сообщает; они видны как рост числа новых соединений.
+STATS = (
+    ('connects', 'foodgram_db_connections_opened_total',
+     'New database connections'),
+)
+
+
+def _count(name):
+    cache = caches[settings.REFERENCE_CACHE_ALIAS]
+    key = f'db:{name}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def db_stats():
+    cache = caches[settings.REFERENCE_CACHE_ALIAS]
+    return {name: cache.get(f'db:{name}', 0) for name, *_ in STATS}
+
+
+def connection_opened(sender, connection, **kwargs):
+    _count('connects')
@@ -1,26 +1,67 @@
+from django import forms
+from django.db.models import Count
 from django_filters import rest_framework as filter
-from recipes.models import Recipes, Tags
-from rest_framework.filters import SearchFilter
+from recipes.models import Recipes, RecipesTags
+from recipes.search import search_recipes
 
+from .cache import tag_ids_by_slug
 
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+
+def tag_choices():
+    return [(slug, slug) for slug in tag_ids_by_slug()]
+
+
+class TagsFilter(filter.MultipleChoiceFilter):
+    # Поле django-filter разворачивает choices при создании формы, а
+    # поле Django вызывает функцию только при проверке значения: карта
+    # тегов не читается, если ?tags= не задан.
+    field_class = forms.MultipleChoiceField
 
 
 class CustomRecipeFilter(filter.FilterSet):
+    """Фильтры рецептов.
 
-    tags = filter.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tags.objects.all(),
-    )
+    Теги проверяются подзапросом к RecipesTags без JOIN, поэтому строки
+    не размножаются при выборе нескольких тегов. ?tags_match=all
+    оставляет рецепты со всеми выбранными тегами (по умолчанию - с
+    любым из них).
+    """
+    tags = TagsFilter(choices=tag_choices, method='get_tags')
+    tags_match = filter.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')), method='skip')
     is_favorited = filter.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filter.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = filter.CharFilter(method='get_search')
 
     class Meta:
         model = Recipes
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['tags', 'tags_match', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'search']
+
+    def __init__(self, data=None, *args, **kwargs):
+        super().__init__(data, *args, **kwargs)
+        slugs = (
+            self.data.getlist('tags') if hasattr(self.data, 'getlist')
+            else None)
+        if slugs:
+            # Проверка choices ниже читает карту тегов из кеша.
+            tag_ids_by_slug(slugs)
+
+    def skip(self, queryset, name, value):
+        return queryset
+
+    def get_tags(self, queryset, name, value):
+        mapping = tag_ids_by_slug()
+        tags_ids = {mapping[slug] for slug in value if slug in mapping}
+        if not tags_ids:
+            return queryset
+        recipes = RecipesTags.objects.filter(
+            tags_id__in=tags_ids).order_by()
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            recipes = recipes.values('recipes_id').annotate(
+                matched=Count('tags_id')).filter(matched=len(tags_ids))
+        return queryset.filter(pk__in=recipes.values('recipes_id'))
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -33,3 +74,10 @@ class CustomRecipeFilter(filter.FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(shopping__user=user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам;
+        результаты сортируются по релевантности."""
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
@@ -0,0 +1,144 @@
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from recipes.counters import change_counter
+from recipes.feed import fan_out, schedule
+from recipes.images import schedule_variants
+from recipes.matching import update_match_index
+from recipes.models import (Ingredients, IngredientsRecipes, Recipes,
+                            RecipesTags, Tags)
+from recipes.search import recipes_changed
+from rest_framework import serializers
+from users.models import User
+
+from .serializers import RecipesImportSerializer
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def ingredient_ids(records):
+    """id ингредиентов из ещё не проверенных строк импорта."""
+    ids = set()
+    for _, record in records:
+        ingredients = record.get('ingredients')
+        if not isinstance(ingredients, list):
+            continue
+        for ingredient in ingredients:
+            try:
+                ids.add(int(ingredient['id']))
+            except (KeyError, TypeError, ValueError):
+                pass
+    return ids
+
+
+class RecipesImporter:
+    """Массовый импорт рецептов из JSON Lines.
+
+    Строки обрабатываются пачками по batch_size: ингредиенты пачки
+    проверяются одним запросом, рецепты и связи пишутся bulk_create.
+    Ошибочные строки пропускаются и попадают в отчёт, не прерывая импорт.
+    """
+
+    def __init__(self, author, batch_size=None):
+        self.author = author
+        self.batch_size = batch_size or settings.RECIPES_IMPORT_BATCH_SIZE
+        self.created = 0
+        self.errors = []
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+        }
+
+    def run(self, lines):
+        known_tags = set(Tags.objects.values_list('id', flat=True))
+        for chunk in chunks(enumerate(lines, 1), self.batch_size):
+            self.import_chunk(chunk, known_tags)
+        return self.report()
+
+    def parse(self, chunk):
+        records = []
+        for number, line in chunk:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                self.errors.append({'line': number, 'errors': str(error)})
+                continue
+            if not isinstance(record, dict):
+                self.errors.append(
+                    {'line': number, 'errors': 'Ожидается JSON-объект'})
+                continue
+            records.append((number, record))
+        return records
+
+    def import_chunk(self, chunk, known_tags):
+        records = self.parse(chunk)
+        serializer = RecipesImportSerializer(context={
+            'known_tags': known_tags,
+            'known_ingredients': set(Ingredients.objects.filter(
+                id__in=ingredient_ids(records)
+            ).values_list('id', flat=True)),
+        })
+        valid = []
+        for number, record in records:
+            try:
+                valid.append(serializer.run_validation(record))
+            except serializers.ValidationError as error:
+                self.errors.append({'line': number, 'errors': error.detail})
+        if valid:
+            self.save(valid)
+
+    @transaction.atomic
+    def save(self, valid):
+        recipes = [
+            Recipes(
+                author=self.author,
+                name=data['name'],
+                text=data['text'],
+                cooking_time=data['cooking_time'],
+                image=data['image'],
+            )
+            for data in valid
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipes.objects.bulk_create(recipes, batch_size=self.batch_size)
+            change_counter(User, self.author.id, 'recipes_count', len(recipes))
+            schedule(fan_out, recipes)
+        else:
+            # Без RETURNING (MySQL) id новых рецептов не узнать:
+            # сохраняем по одному (счётчики и ленты обновят сигналы).
+            for recipe in recipes:
+                recipe.save()
+        RecipesTags.objects.bulk_create((
+            RecipesTags(recipes=recipe, tags_id=tag)
+            for recipe, data in zip(recipes, valid)
+            for tag in set(data['tags'])
+        ), batch_size=self.batch_size)
+        IngredientsRecipes.objects.bulk_create((
+            IngredientsRecipes(
+                recipes=recipe,
+                ingredients_id=ingredient['id'],
+                amount=ingredient['amount'])
+            for recipe, data in zip(recipes, valid)
+            for ingredient in data['ingredients']
+        ), batch_size=self.batch_size)
+        for recipe in recipes:
+            schedule_variants(recipe)
+        recipes_ids = [recipe.pk for recipe in recipes]
+        recipes_changed(recipes_ids)
+        update_match_index(recipes_ids)
+        self.created += len(recipes)
@@ -0,0 +1,235 @@
+import json
+import os
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Recipes
+from recipes.synthetic import generate, pick_fixtures
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+# Сценарий - последовательность запросов, которая замеряется целиком.
+SCENARIOS = {
+    'tags': [('get', '/api/tags/')],
+    'ingredients search': [('get', '/api/ingredients/?name={ingredient}')],
+    'recipes': [('get', '/api/recipes/')],
+    'recipes page 10': [('get', '/api/recipes/?page=10')],
+    'recipes cursor': [('get', '/api/recipes/?pagination=cursor')],
+    'recipes by tag': [('get', '/api/recipes/?tags={tag}')],
+    'recipes by author': [('get', '/api/recipes/?author={author}')],
+    'recipes favorited': [('get', '/api/recipes/?is_favorited=1')],
+    'recipes search': [('get', '/api/recipes/?search={word}')],
+    'recipes match': [
+        ('get', '/api/recipes/match/?ingredients={ingredients}&missing=2')],
+    'recipe detail': [('get', '/api/recipes/{recipe}/')],
+    'feed': [('get', '/api/recipes/feed/')],
+    'subscriptions': [('get', '/api/users/subscriptions/?recipes_limit=3')],
+    'users': [('get', '/api/users/')],
+    'me': [('get', '/api/users/me/')],
+    'download shopping cart': [
+        ('get', '/api/recipes/download_shopping_cart/')],
+    'favorite add/remove': [
+        ('post', '/api/recipes/{new_recipe}/favorite/'),
+        ('delete', '/api/recipes/{new_recipe}/favorite/'),
+    ],
+    'shopping cart add/remove': [
+        ('post', '/api/recipes/{new_recipe}/shopping_cart/'),
+        ('delete', '/api/recipes/{new_recipe}/shopping_cart/'),
+    ],
+    'subscribe/unsubscribe': [
+        ('post', '/api/users/{new_author}/subscribe/'),
+        ('delete', '/api/users/{new_author}/subscribe/'),
+    ],
+}
+
+
+def percentile(values, q):
+    """Перцентиль по ближайшему рангу; values отсортированы."""
+    rank = max(int(round(q / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def scenario_params(fixtures):
+    """Подстановки для путей SCENARIOS. new_recipe и new_author -
+    рецепт и автор, с которыми у пользователя ещё нет связей: на них
+    проверяются добавление и удаление."""
+    user, recipe = fixtures['user'], fixtures['recipe']
+    new_recipe = Recipes.objects.exclude(favorites__user=user).exclude(
+        shopping__user=user).order_by('-favorites_count').first()
+    new_author = User.objects.exclude(pk=user.pk).exclude(
+        following__user=user).order_by('-followers_count').first()
+    # Продукты пользователя - состав рецепта без двух ингредиентов:
+    # с missing=2 подбор находит хотя бы этот рецепт.
+    ingredients = list(recipe.ingredients.values_list('id', 'name'))
+    owned = ingredients[:-2] or ingredients
+    return {
+        'recipe': recipe.id,
+        'new_recipe': new_recipe.id,
+        'new_author': new_author.id,
+        'author': fixtures['author'].id,
+        'tag': fixtures['tag'].slug,
+        'word': recipe.name.split()[-1],
+        'ingredient': ingredients[0][1][:3] if ingredients else 'а',
+        'ingredients': ','.join(str(pk) for pk, _ in owned) or '1',
+    }
+
+
+class Command(BaseCommand):
+    """Нагрузочный прогон эндпоинтов API внутри процесса.
+
+    Для каждого сценария из SCENARIOS считает p50/p95/p99 времени
+    ответа, число SQL-запросов и пиковый объём памяти, выделенной за
+    один проход (tracemalloc). Запросы выполняются через APIClient от
+    имени активного пользователя внутри транзакции, которая в конце
+    откатывается. С --save результаты записываются в файл базовой
+    линии, без него сравниваются с ней: команда завершается с ошибкой,
+    если вырос p95 или память больше чем на --tolerance или выросло
+    число запросов.
+
+    Базовая линия в репозитории (benchmark.json) записана на пустой
+    SQLite командой benchmark --generate 5000 --save. Число запросов
+    в ней от машины не зависит, а время и память стоит перезаписать
+    с --save на своём окружении и сравнивать с тем же --generate.
+    """
+    help = 'Замеряет задержки, запросы и память эндпоинтов API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--only', nargs='+', metavar='SCENARIO',
+            help='Прогнать только эти сценарии')
+        parser.add_argument(
+            '--generate', type=int, metavar='RECIPES',
+            help='Сгенерировать столько рецептов на время прогона')
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, 'benchmark.json'),
+            help='Файл базовой линии')
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Записать результаты как базовую линию')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый относительный рост p95 и памяти')
+
+    def handle(self, *args, **options):
+        scenarios = {
+            name: steps for name, steps in SCENARIOS.items()
+            if not options['only'] or name in options['only']
+        }
+        if not scenarios:
+            raise CommandError(
+                'Неизвестные сценарии, доступны: ' + ', '.join(SCENARIOS))
+        with transaction.atomic():
+            if options['generate']:
+                generate(recipes=options['generate'], seed=20)
+            fixtures = pick_fixtures()
+            if fixtures is None:
+                raise CommandError(
+                    'Нет данных: запустите generatedata или --generate')
+            client = APIClient()
+            token, _ = Token.objects.get_or_create(user=fixtures['user'])
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            params = scenario_params(fixtures)
+            results = {
+                name: self.measure(client, [
+                    (method, path.format(**params)) for method, path in steps
+                ], options['iterations'], options['warmup'])
+                for name, steps in scenarios.items()
+            }
+            transaction.set_rollback(True)
+        if options['save']:
+            with open(options['baseline'], 'w') as fout:
+                json.dump(results, fout, indent=4, sort_keys=True)
+            self.report(results, {})
+            self.stdout.write(self.style.SUCCESS(
+                f"Базовая линия записана в {options['baseline']}"))
+            return
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as fin:
+                baseline = json.load(fin)
+        regressions = self.report(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовой линии:\n'
+                + '\n'.join(regressions))
+        if baseline:
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def run(self, client, steps):
+        for method, url in steps:
+            response = getattr(client, method)(url)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {url}: HTTP {response.status_code}')
+            if response.streaming:
+                # Потоковый ответ читает БД при обходе тела.
+                for _ in response.streaming_content:
+                    pass
+
+    def measure(self, client, steps, iterations, warmup):
+        for _ in range(warmup):
+            self.run(client, steps)
+        # Запросы и память считаются отдельными проходами, чтобы их
+        # учёт не искажал время ответа.
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.run(client, steps)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        queries = []
+
+        def count(execute, sql, *args):
+            queries.append(sql)
+            return execute(sql, *args)
+
+        with connection.execute_wrapper(count):
+            self.run(client, steps)
+        tracemalloc.start()
+        try:
+            self.run(client, steps)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries': len(queries),
+            'alloc_kib': round(peak / 1024, 1),
+        }
+
+    def report(self, results, baseline, tolerance=0):
+        regressions = []
+        self.stdout.write(
+            f"{'сценарий':<26}{'p50':>9}{'p95':>9}{'p99':>9}"
+            f"{'запросы':>9}{'KiB':>9}  к базовой линии")
+        for name, result in results.items():
+            line = (
+                f"{name:<26}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['queries']:>9}"
+                f"{result['alloc_kib']:>9.1f}")
+            base = baseline.get(name)
+            if base:
+                line += (
+                    f"  p95 {result['p95_ms'] / base['p95_ms'] - 1:+.0%},"
+                    f" запросы {result['queries'] - base['queries']:+d},"
+                    f" KiB {result['alloc_kib'] / base['alloc_kib'] - 1:+.0%}")
+                regressions.extend(
+                    f'{name}: {metric} {base[metric]} -> {result[metric]}'
+                    for metric, limit in (
+                        ('p95_ms', base['p95_ms'] * (1 + tolerance)),
+                        ('queries', base['queries']),
+                        ('alloc_kib', base['alloc_kib'] * (1 + tolerance)),
+                    )
+                    if result[metric] > limit
+                )
+            self.stdout.write(line)
+        return regressions
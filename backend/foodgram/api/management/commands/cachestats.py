@@ -0,0 +1,24 @@
+from api.cache import cache_stats, is_process_local
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Показывает попадания и промахи кеша справочных эндпоинтов.
+
+    Счётчики читаются из кеша справочников, поэтому команда работает
+    только с общим кешем: в LocMemCache она увидела бы счётчики своего
+    процесса, то есть нули.
+    """
+    help = 'Статистика кеша ответов для тегов и ингредиентов.'
+
+    def handle(self, *args, **options):
+        if is_process_local():
+            raise CommandError(
+                'Кеш справочников - LocMemCache, счётчики есть только в '
+                'процессах сервера: задайте общий CACHE_BACKEND')
+        for resource, stats in cache_stats(('tags', 'ingredients')).items():
+            total = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / total if total else 0
+            self.stdout.write(
+                f"{resource}: hits={stats['hits']} "
+                f"misses={stats['misses']} hit_ratio={ratio:.2%}")
@@ -0,0 +1,187 @@
+import json
+import re
+
+from api.views import RecipesViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from recipes.feed import get_feed
+from recipes.models import Favorites, RecipesTags, ShoppingCart
+from recipes.queries import latest_recipes
+from recipes.synthetic import generate, pick_fixtures
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscription, User
+
+# Таблицы, которые нельзя читать последовательным сканированием.
+HOT_TABLES = {
+    'recipes_recipes', 'recipes_favorites', 'recipes_shoppingcart',
+    'recipes_feedentry', 'recipes_recipestags', 'users_subscription',
+}
+
+# Допустимое число запросов на один вызов эндпоинта. Менять осознанно:
+# рост числа запросов - регрессия.
+QUERY_BUDGETS = {
+    '/api/recipes/': 7,
+    '/api/recipes/?is_favorited=1': 7,
+    '/api/recipes/?tags={tag}&tags_match=all': 8,
+    '/api/recipes/?author={author}&pagination=cursor': 7,
+    '/api/recipes/{recipe}/': 6,
+    '/api/recipes/feed/': 7,
+    '/api/users/subscriptions/?recipes_limit=3': 4,
+    '/api/recipes/download_shopping_cart/': 2,
+}
+
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(.*)')
+
+
+def hot_querysets(user, author, recipe, tag):
+    recipes = RecipesViewSet().get_queryset().order_by('-pub_date', '-id')
+    return {
+        'recipes page': recipes[:6],
+        'recipes by author': recipes.filter(author=author)[:6],
+        'favorited by user': recipes.filter(favorites__user=user)[:6],
+        'recipes by tag': recipes.filter(pk__in=RecipesTags.objects.filter(
+            tags_id__in=[tag]).values('recipes_id'))[:6],
+        'user favorites': Favorites.objects.filter(
+            user=user).values_list('recipes_id', flat=True),
+        'user shopping cart': ShoppingCart.objects.filter(
+            user=user).values_list('recipes_id', flat=True),
+        'user following': Subscription.objects.filter(
+            user=user).values_list('following_id', flat=True),
+        'author followers': Subscription.objects.filter(
+            following=author).values_list('user_id', flat=True),
+        'recipe favorites': Favorites.objects.filter(recipes=recipe),
+        'recipe shopping carts': ShoppingCart.objects.filter(recipes=recipe),
+        'subscriptions page': User.objects.filter(
+            following__user=user).order_by('-id')[:6],
+        'latest recipes per author': latest_recipes(
+            Subscription.objects.filter(user=user).values_list(
+                'following_id', flat=True)[:6], 3),
+        'feed page': get_feed(user).order_by('-feed_date', '-id')[:6],
+    }
+
+
+def explain(queryset, prefix):
+    """Строки плана запроса. QuerySet.explain() не годится: на
+    PostgreSQL он отдаёт JSON, уже разобранный psycopg2, через str(), а
+    в запросе с фильтром по оконной функции ставит EXPLAIN во
+    внутренний подзапрос."""
+    sql, params = queryset.query.get_compiler(connection.alias).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return cursor.fetchall()
+
+
+def sequential_scans(queryset):
+    """Горячие таблицы, которые план запроса читает целиком."""
+    if connection.vendor == 'postgresql':
+        plan = explain(queryset, 'EXPLAIN (FORMAT JSON)')[0][0][0]['Plan']
+        nodes, found = [plan], set()
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', ()))
+            if node['Node Type'] == 'Seq Scan':
+                found.add(node['Relation Name'])
+        return found & HOT_TABLES
+    if connection.vendor == 'sqlite':
+        # SCAN ... USING INDEX - это обход всего индекса; он дешёв,
+        # только если запрос ограничен LIMIT.
+        limited = queryset.query.high_mark is not None
+        return {
+            match.group(1)
+            for *_, detail in explain(queryset, 'EXPLAIN QUERY PLAN')
+            for match in SQLITE_SCAN.finditer(detail)
+            if not (limited and 'USING' in match.group(2))
+        } & HOT_TABLES
+    return None
+
+
+class Command(BaseCommand):
+    """Проверка планов горячих запросов и числа запросов эндпоинтов.
+
+    Заполняет БД синтетическими данными внутри транзакции, прогоняет
+    запросы API через EXPLAIN и вызывает эндпоинты, после чего
+    откатывает транзакцию. Завершается с ошибкой, если какой-то запрос
+    читает горячую таблицу последовательным сканированием или эндпоинт
+    превысил QUERY_BUDGETS.
+    """
+    help = 'Проверяет планы горячих запросов и число запросов API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=20_000,
+            help='Сколько синтетических рецептов создать')
+        parser.add_argument(
+            '--no-seed', action='store_true',
+            help='Проверять на данных, которые уже есть в БД')
+        parser.add_argument(
+            '--record', action='store_true',
+            help='Вывести фактическое число запросов вместо проверки')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            failures = self.run_checks(options)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def run_checks(self, options):
+        if not options['no_seed']:
+            self.stdout.write(
+                f"Синтетические данные: {options['recipes']} рецептов")
+            generate(recipes=options['recipes'], seed=19)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for table in HOT_TABLES:
+                    cursor.execute(f'ANALYZE {table}')
+        fixtures = pick_fixtures()
+        if fixtures is None:
+            raise CommandError('Нет данных для проверки, уберите --no-seed')
+        user, author, recipe, tag = (
+            fixtures[key] for key in ('user', 'author', 'recipe', 'tag'))
+        return (
+            self.check_plans(hot_querysets(user, author, recipe, tag.id))
+            + self.check_budgets(user, {
+                'author': author.id,
+                'recipe': recipe.id,
+                'tag': tag.slug,
+            }, options['record'])
+        )
+
+    def check_plans(self, querysets):
+        failures = []
+        for name, queryset in querysets.items():
+            scans = sequential_scans(queryset)
+            if scans is None:
+                self.stdout.write(
+                    f'EXPLAIN для {connection.vendor} не проверяется')
+                break
+            if scans:
+                failures.append(f'{name}: Seq Scan по {", ".join(scans)}')
+            self.stdout.write(f"{'SEQ' if scans else 'ok '} {name}")
+        return failures
+
+    def check_budgets(self, user, params, record):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        # Бюджеты считаются при прогретом кеше аутентификации.
+        client.get('/api/users/me/')
+        failures = []
+        recorded = {}
+        for path, budget in QUERY_BUDGETS.items():
+            url = path.format(**params)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            count = recorded[path] = len(queries.captured_queries)
+            if response.status_code != 200:
+                failures.append(f'{url}: HTTP {response.status_code}')
+            elif count > budget and not record:
+                failures.append(f'{url}: {count} запросов, бюджет {budget}')
+            self.stdout.write(f'{count:>3}/{budget:<3} {url}')
+        if record:
+            self.stdout.write(json.dumps(recorded, indent=4))
+        return failures
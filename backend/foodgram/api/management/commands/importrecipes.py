@@ -0,0 +1,41 @@
+import json
+import time
+
+from api.importers import RecipesImporter
+from django.core.management.base import BaseCommand, CommandError
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Массовый импорт рецептов из файла JSON Lines."""
+    help = 'Импортирует рецепты из файла JSON Lines (один рецепт в строке).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .jsonl')
+        parser.add_argument(
+            '--author', required=True, help='id или email автора рецептов')
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Размер пачки для bulk_create')
+
+    def get_author(self, author):
+        lookup = {'pk': author} if author.isdigit() else {'email': author}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f'Автор {author} не найден')
+
+    def handle(self, *args, **options):
+        author = self.get_author(options['author'])
+        started = time.monotonic()
+        with open(options['path'], encoding='utf-8') as lines:
+            report = RecipesImporter(author, options['batch_size']).run(lines)
+        elapsed = time.monotonic() - started
+        for error in report['errors']:
+            self.stderr.write(
+                f"строка {error['line']}: "
+                f"{json.dumps(error['errors'], ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: {report['created']}, ошибок: {report['failed']}, "
+            f"{report['created'] / elapsed if elapsed else 0:.0f} рецептов/с"
+        ))
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from http.client import HTTPConnection, HTTPException
+from itertools import cycle
+from urllib.parse import quote, urlsplit
+
+from api.management.commands.benchmark import percentile
+from django.core.management.base import BaseCommand, CommandError
+
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=5',
+    '/api/ingredients/?name=мо',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+def process_tree(pid):
+    pids, queue = [], [pid]
+    while queue:
+        pid = queue.pop()
+        pids.append(pid)
+        try:
+            for task in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{task}/children') as fin:
+                    queue.extend(int(child) for child in fin.read().split())
+        except FileNotFoundError:
+            continue
+    return pids
+
+
+def rss_mib(pid):
+    """Суммарный RSS процесса и его потомков (Linux)."""
+    total = 0
+    for child in process_tree(pid):
+        try:
+            with open(f'/proc/{child}/status') as fin:
+                for line in fin:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            continue
+    return total / 1024
+
+
+class Command(BaseCommand):
+    """Нагрузка на запущенный сервер по HTTP.
+
+    Для сравнения WSGI и ASGI запустите оба варианта с одинаковым
+    числом воркеров:
+
+        gunicorn foodgram.wsgi:application -w 4 --threads 1
+        gunicorn foodgram.asgi:application -w 4 \\
+            -k uvicorn.workers.UvicornWorker
+
+    и прогоните команду против каждого с --server-pid (pid мастера
+    gunicorn): кроме пропускной способности и задержек она покажет
+    пиковый RSS сервера, чтобы сравнение шло при равной памяти.
+    """
+    help = 'Нагружает сервер параллельными запросами и меряет req/s.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес сервера, http://host:port')
+        parser.add_argument(
+            '--paths', nargs='+', default=PATHS,
+            help='Пути, которые запрашиваются по кругу')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--duration', type=float, default=30, help='Секунд нагрузки')
+        parser.add_argument('--token', help='Токен для Authorization')
+        parser.add_argument(
+            '--server-pid', type=int,
+            help='pid сервера для замера RSS (Linux)')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Нужен адрес вида http://host:port')
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Token {options['token']}"
+        deadline = time.monotonic() + options['duration']
+        paths = [quote(path, safe='/?=&%') for path in options['paths']]
+        timings, errors, peak_rss = [], [], 0
+        workers = [
+            threading.Thread(target=self.worker, args=(
+                url, paths, headers, deadline, timings, errors))
+            for _ in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            if options['server_pid']:
+                peak_rss = max(peak_rss, rss_mib(options['server_pid']))
+            time.sleep(0.5)
+        if not timings:
+            raise CommandError(f'Нет успешных ответов: {errors[:3]}')
+        timings.sort()
+        self.stdout.write(
+            f"{len(timings) / options['duration']:.1f} req/s, "
+            f"p50 {percentile(timings, 50):.1f} мс, "
+            f"p95 {percentile(timings, 95):.1f} мс, "
+            f"p99 {percentile(timings, 99):.1f} мс, "
+            f"ошибок {len(errors)}")
+        if options['server_pid']:
+            self.stdout.write(f'Пиковый RSS сервера: {peak_rss:.0f} MiB')
+        for error in sorted(set(errors))[:5]:
+            self.stderr.write(f'  {error}')
+
+    def worker(self, url, paths, headers, deadline, timings, errors):
+        connection = HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        for path in cycle(paths):
+            if time.monotonic() >= deadline:
+                break
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, HTTPException) as error:
+                errors.append(f'{path}: {error!r}')
+                connection.close()
+                continue
+            if response.status >= 400:
+                errors.append(f'{path}: HTTP {response.status}')
+            else:
+                # list.append потокобезопасен.
+                timings.append((time.perf_counter() - started) * 1000)
+        connection.close()
@@ -0,0 +1,110 @@
+import json
+from collections import defaultdict
+
+from api.management.commands.benchmark import percentile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ORDERINGS = {
+    'p95': lambda stats: stats['p95_ms'],
+    'total': lambda stats: stats['total_ms'],
+    'queries': lambda stats: stats['queries'],
+    'duplicates': lambda stats: stats['duplicates'],
+}
+
+
+def read_profiles(paths):
+    for path in paths:
+        with open(path, encoding='utf-8') as fin:
+            for line in fin:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class Command(BaseCommand):
+    """Сводка по журналу ProfilingMiddleware.
+
+    Показывает самые медленные эндпоинты (p95 и суммарное время, средние
+    число запросов, время БД и представления вне SQL, размер ответа) и формы
+    SQL-запросов, которые чаще всего повторяются в пределах одного
+    запроса - кандидатов на select_related/prefetch_related.
+    """
+    help = 'Худшие эндпоинты и повторяющиеся SQL-запросы по журналу.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Файлы журнала (по умолчанию PROFILING_LOG_FILE)')
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--order-by', choices=ORDERINGS, default='p95',
+            help='Как упорядочить эндпоинты')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            path for path in [settings.PROFILING_LOG_FILE] if path]
+        if not paths:
+            raise CommandError('Укажите файл журнала или PROFILING_LOG_FILE')
+        endpoints = defaultdict(list)
+        shapes = {}
+        for profile in read_profiles(paths):
+            endpoints[profile['endpoint']].append(profile)
+            for duplicate in profile['duplicates']:
+                shape = shapes.setdefault(duplicate['fingerprint'], {
+                    'sql': duplicate['sql'], 'repeats': 0,
+                    'requests': 0, 'endpoints': set(),
+                })
+                shape['repeats'] += duplicate['count'] - 1
+                shape['requests'] += 1
+                shape['endpoints'].add(profile['endpoint'])
+        if not endpoints:
+            raise CommandError('В журнале нет записей профилирования')
+        self.report_endpoints(
+            endpoints, ORDERINGS[options['order_by']], options['top'])
+        self.report_shapes(shapes, options['top'])
+
+    def report_endpoints(self, endpoints, key, top):
+        rows = []
+        for endpoint, profiles in endpoints.items():
+            count = len(profiles)
+            durations = sorted(profile['duration_ms'] for profile in profiles)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': count,
+                'p95_ms': percentile(durations, 95),
+                'total_ms': sum(durations),
+                'queries': sum(p['queries'] for p in profiles) / count,
+                'duplicates': sum(
+                    d['count'] - 1 for p in profiles for d in p['duplicates']
+                ) / count,
+                'db_ms': sum(p['db_ms'] for p in profiles) / count,
+                'view_ms': sum(p['view_ms'] for p in profiles) / count,
+                'kib': sum(p['response_bytes'] for p in profiles) / count
+                / 1024,
+            })
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{'эндпоинт':<40}{'n':>6}{'p95 мс':>9}{'всего с':>9}"
+            f"{'SQL':>6}{'повт.':>6}{'БД мс':>8}{'предст.':>8}{'KiB':>8}"))
+        for row in sorted(rows, key=key, reverse=True)[:top]:
+            self.stdout.write(
+                f"{row['endpoint']:<40}{row['requests']:>6}"
+                f"{row['p95_ms']:>9.1f}{row['total_ms'] / 1000:>9.1f}"
+                f"{row['queries']:>6.1f}{row['duplicates']:>6.1f}"
+                f"{row['db_ms']:>8.1f}{row['view_ms']:>8.1f}"
+                f"{row['kib']:>8.1f}")
+
+    def report_shapes(self, shapes, top):
+        if not shapes:
+            self.stdout.write('Повторяющихся запросов нет')
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            '\nПовторяющиеся формы запросов (лишних выполнений):'))
+        for key, shape in sorted(
+                shapes.items(), key=lambda item: item[1]['repeats'],
+                reverse=True)[:top]:
+            self.stdout.write(
+                f"{shape['repeats']:>7} в {shape['requests']} запросах "
+                f"[{key}] {', '.join(sorted(shape['endpoints']))}")
+            self.stdout.write(f"        {shape['sql'][:300]}")
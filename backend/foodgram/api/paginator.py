@@ -1,6 +1,93 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db import connections
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по плану запроса PostgreSQL без COUNT(*)."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    # QuerySet.explain() превращает разобранный psycopg2
+    # JSON в строку через str(), поэтому план читается курсором.
+    sql, params = queryset.order_by().query.get_compiler(
+        queryset.db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная пагинация без OFFSET и обязательного COUNT(*).
+
+    Порядок берётся из cursor_ordering представления, а результаты
+    поиска (?search=) листаются по релевантности. Число объектов
+    возвращается только по запросу: ?count=exact или ?count=estimate.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+    count_query_param = 'count'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by
+        if ordering and ordering[0] == '-search_rank':
+            return tuple(ordering)
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count = estimate_count(queryset)
+        else:
+            self.count = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+        return response
+
+
+class RankedPagination(PageNumberPagination):
+    """Постраничная пагинация списков, ранжированных в памяти."""
+    page_size = 6
+    page_size_query_param = 'limit'
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с переключением на курсорную.
+
+    Курсорный режим включается параметром ?pagination=cursor
+    (ссылки next/previous сохраняют его вместе с ?cursor=).
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_pagination_class = KeysetPagination
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or 'cursor' in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
@@ -0,0 +1,12 @@
+from rest_framework.parsers import BaseParser
+
+
+class JSONLinesParser(BaseParser):
+    """Отдаёт тело запроса в формате JSON Lines построчно, не читая
+    его целиком."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        return stream
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse
+
+from .cache import is_process_local
+from .db import STATS, db_stats
+
+logger = logging.getLogger('foodgram.profiling')
+
+# Реестр эндпоинтов для /metrics: число и номер -> эндпоинт.
+ENDPOINTS_COUNT_KEY = 'profiling:endpoints:count'
+# Счётчики на эндпоинт: (ключ, имя метрики, делитель, описание).
+METRICS = (
+    ('requests', 'foodgram_requests_total', 1,
+     'Profiled requests'),
+    ('duration_us', 'foodgram_request_duration_seconds_total', 1e6,
+     'Total request time'),
+    ('queries', 'foodgram_request_queries_total', 1,
+     'SQL queries'),
+    ('duplicates', 'foodgram_request_duplicate_queries_total', 1,
+     'Repeated executions of the same query shape (N+1)'),
+    ('db_us', 'foodgram_request_db_seconds_total', 1e6,
+     'Time spent in SQL queries'),
+    ('view_us', 'foodgram_request_view_seconds_total', 1e6,
+     'Time spent in views outside SQL, mostly serialization'),
+    ('response_bytes', 'foodgram_response_bytes_total', 1,
+     'Response body size'),
+)
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )+%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+_current = ContextVar('profile', default=None)
+
+
+def get_cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def fingerprint(sql):
+    """Форма запроса: параметры, литералы и длина списков IN
+    не различаются."""
+    shape = LITERAL_RE.sub('?', IN_LIST_RE.sub('IN (...)', sql))
+    return hashlib.md5(shape.encode()).hexdigest()[:12], shape
+
+
+class Profile:
+    """Замеры одного запроса; сам служит execute_wrapper соединений."""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.shapes = {}
+        self.db_time = 0.0
+        self.view_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            key, shape = fingerprint(sql)
+            self.queries[key] += 1
+            self.shapes.setdefault(key, shape)
+
+    def duplicates(self):
+        return {
+            key: count for key, count in self.queries.items() if count > 1
+        }
+
+    def wrap_connections(self, stack):
+        """Подключает профиль к соединениям текущего потока до закрытия
+        stack."""
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+
+
+class ProfiledViewMixin:
+    """Время представления DRF вне SQL - в основном сериализация - для
+    профилируемых запросов.
+
+    Отсчёт идёт от initialize_request() до finalize_response(): их
+    вызывают и dispatch(), и асинхронные представления.
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        profile = _current.get()
+        if profile is not None:
+            self.profile_started = (time.perf_counter(), profile.db_time)
+        return super().initialize_request(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = _current.get()
+        started = getattr(self, 'profile_started', None)
+        if profile is not None and started is not None:
+            started_at, db_time = started
+            profile.view_time += (
+                time.perf_counter() - started_at
+                - (profile.db_time - db_time))
+            self.profile_started = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def _key(endpoint, name):
+    # В ключах memcached не должно быть пробелов.
+    digest = hashlib.md5(endpoint.encode()).hexdigest()[:12]
+    return f'profiling:{digest}:{name}'
+
+
+def _slot_key(number):
+    return f'profiling:endpoints:{number}'
+
+
+def register(endpoint):
+    """Вносит эндпоинт в реестр. Вносит тот процесс, чей cache.add
+    прошёл, а номер записи выдаёт cache.incr, поэтому процессы не
+    перетирают записи друг друга."""
+    cache = get_cache()
+    if not cache.add(_key(endpoint, 'registered'), True, None):
+        return
+    cache.add(ENDPOINTS_COUNT_KEY, 0, None)
+    try:
+        number = cache.incr(ENDPOINTS_COUNT_KEY)
+    except ValueError:
+        return
+    cache.set(_slot_key(number), endpoint, None)
+
+
+def registered_endpoints():
+    cache = get_cache()
+    count = cache.get(ENDPOINTS_COUNT_KEY, 0)
+    return sorted(set(cache.get_many(
+        [_slot_key(number) for number in range(1, count + 1)]).values()))
+
+
+def record(endpoint, values):
+    register(endpoint)
+    cache = get_cache()
+    for key, value in values.items():
+        cache_key = _key(endpoint, key)
+        cache.add(cache_key, 0, None)
+        try:
+            cache.incr(cache_key, value)
+        except ValueError:
+            pass
+
+
+class ProfilingMiddleware:
+    """Профилирование SQL и сериализации для выборки запросов.
+
+    Доля запросов задаётся PROFILING_SAMPLE_RATE (0 - выключено). Для
+    каждого выбранного запроса считаются число SQL-запросов, время в БД,
+    повторяющиеся формы запросов (признак N+1), время представления вне
+    SQL (ProfiledViewMixin) и размер ответа. Запросы к БД считает
+    execute_wrapper, подключённый только на время выбранного запроса.
+    Итоги по эндпоинтам копятся счётчиками в кеше и отдаются в /metrics,
+    каждый запрос пишется JSON-строкой в логгер foodgram.profiling
+    (см. команду profilereport).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # Под ASGI Django передаёт асинхронный get_response.
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        return (
+            rate > 0 and random.random() < rate
+            and request.path != '/metrics')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                profile.wrap_connections(stack)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.report(request, response, profile,
+                    time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+        profile = Profile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        # Под ASGI запросы к БД идут в потоке запроса (sync_to_async с
+        # thread_sensitive), поэтому обёртки ставятся и снимаются там же.
+        stack = ExitStack()
+        try:
+            await sync_to_async(profile.wrap_connections)(stack)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        await sync_to_async(self.report)(
+            request, response, profile, time.perf_counter() - started)
+        return response
+
+    def report(self, request, response, profile, duration):
+        match = request.resolver_match
+        endpoint = (
+            f'{request.method} {match.view_name if match else "unresolved"}')
+        duplicates = profile.duplicates()
+        size = 0 if response.streaming else len(response.content)
+        record(endpoint, {
+            'requests': 1,
+            'duration_us': int(duration * 1e6),
+            'queries': sum(profile.queries.values()),
+            'duplicates': sum(duplicates.values()),
+            'db_us': int(profile.db_time * 1e6),
+            'view_us': int(profile.view_time * 1e6),
+            'response_bytes': size,
+        })
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': sum(profile.queries.values()),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'view_ms': round(profile.view_time * 1000, 2),
+            'response_bytes': size,
+            'duplicates': [
+                {'fingerprint': key, 'count': count,
+                 'sql': profile.shapes[key]}
+                for key, count in duplicates.items()
+            ],
+        }, ensure_ascii=False))
+
+
+def metrics(request):
+    """Счётчики профилирования в текстовом формате Prometheus.
+
+    Значения накоплены только по выбранным запросам; доля выборки
+    отдаётся отдельной метрикой. Счётчики общие для процессов, только
+    если общий кеш (CACHE_BACKEND); с LocMemCache ответ описывает
+    процесс, который его обслужил (см. проверку api.W001). nginx этот
+    путь наружу не проксирует.
+    """
+    cache = get_cache()
+    endpoints = registered_endpoints()
+    values = cache.get_many([
+        _key(endpoint, key) for endpoint in endpoints for key, *_ in METRICS
+    ])
+    lines = []
+    if is_process_local():
+        lines.append(
+            f'# Counters of worker process {os.getpid()} only: '
+            f'CACHE_BACKEND is LocMemCache')
+    lines += [
+        '# HELP foodgram_profiling_sample_rate Share of profiled requests',
+        '# TYPE foodgram_profiling_sample_rate gauge',
+        f'foodgram_profiling_sample_rate {settings.PROFILING_SAMPLE_RATE}',
+    ]
+    for (key, name, description), value in zip(STATS, db_stats().values()):
+        lines += [
+            f'# HELP {name} {description}', f'# TYPE {name} counter',
+            f'{name} {value}']
+    for key, name, scale, description in METRICS:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        for endpoint in endpoints:
+            method, view = endpoint.split(' ', 1)
+            value = values.get(_key(endpoint, key), 0)
+            if scale != 1:
+                value /= scale
+            lines.append(
+                f'{name}{{method="{method}",view="{view}"}} {value}')
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,79 @@
+from django.utils.functional import cached_property
+from recipes.models import Favorites, ShoppingCart
+from users.models import Subscription
+
+
+class UserRelations:
+    """Связи текущего пользователя: избранное, корзина и подписки.
+
+    Каждое множество загружается одним запросом при первом обращении
+    и используется всеми сериализаторами в рамках запроса. Асинхронные
+    представления загружают их заранее через aload().
+    """
+    # Множество: (модель, поле со связанным id).
+    SETS = {
+        'favorites': (Favorites, 'recipes_id'),
+        'shopping_cart': (ShoppingCart, 'recipes_id'),
+        'following': (Subscription, 'following_id'),
+    }
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def is_authenticated(self):
+        return self.user is not None and self.user.is_authenticated
+
+    def _queryset(self, name):
+        model, field = self.SETS[name]
+        return model.objects.filter(user=self.user).values_list(
+            field, flat=True)
+
+    def _ids(self, name):
+        if not self.is_authenticated:
+            return frozenset()
+        return frozenset(self._queryset(name))
+
+    async def aload(self):
+        """Загружает все множества асинхронным ORM, чтобы сериализаторы
+        не обращались к БД из цикла событий."""
+        for name in self.SETS:
+            if name in self.__dict__:
+                continue
+            ids = frozenset()
+            if self.is_authenticated:
+                ids = frozenset([pk async for pk in self._queryset(name)])
+            self.__dict__[name] = ids
+
+    @cached_property
+    def favorites(self):
+        return self._ids('favorites')
+
+    @cached_property
+    def shopping_cart(self):
+        return self._ids('shopping_cart')
+
+    @cached_property
+    def following(self):
+        return self._ids('following')
+
+    def is_favorited(self, recipe):
+        return recipe.pk in self.favorites
+
+    def is_in_shopping_cart(self, recipe):
+        return recipe.pk in self.shopping_cart
+
+    def is_subscribed(self, user):
+        return user.pk in self.following
+
+
+def get_user_relations(request):
+    """Возвращает связи пользователя, общие для всего запроса."""
+    if request is None:
+        return UserRelations(None)
+    http_request = getattr(request, '_request', request)
+    relations = getattr(http_request, 'user_relations', None)
+    if relations is None or relations.user != request.user:
+        relations = UserRelations(request.user)
+        http_request.user_relations = relations
+    return relations
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_TITLE = 'Список покупок:'
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    stream() получает итератор строк агрегата с ключами
+    ingredients__name, ingredients__measurement_unit, amount, astream() -
+    асинхронный итератор тех же строк. Оба отдают ответ частями, не
+    собирая его целиком в памяти: header(), row() для каждой строки и
+    footer().
+    """
+    def header(self):
+        return ''
+
+    def row(self, num, row):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+    def stream(self, rows):
+        yield self.header()
+        for num, row in enumerate(rows):
+            yield self.row(num, row)
+        yield self.footer()
+
+    async def astream(self, rows):
+        yield self.header()
+        num = 0
+        async for row in rows:
+            yield self.row(num, row)
+            num += 1
+        yield self.footer()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Через render() проходят только ответы с ошибками.
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def header(self):
+        return SHOPPING_LIST_TITLE
+
+    def row(self, num, row):
+        return (
+            f"{', ' if num else ''}\n{row['ingredients__name']} - "
+            f"{row['amount']} {row['ingredients__measurement_unit']}"
+        )
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def line(self, values):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    def header(self):
+        return self.line(('name', 'amount', 'measurement_unit'))
+
+    def row(self, num, row):
+        return self.line((
+            row['ingredients__name'],
+            row['amount'],
+            row['ingredients__measurement_unit'],
+        ))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def header(self):
+        return '['
+
+    def row(self, num, row):
+        return (',' if num else '') + json.dumps({
+            'name': row['ingredients__name'],
+            'amount': row['amount'],
+            'measurement_unit': row['ingredients__measurement_unit'],
+        }, ensure_ascii=False)
+
+    def footer(self):
+        return ']'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """PDF собирается в памяти целиком: формат не допускает потоковой
+    записи, но строки агрегата всё равно читаются итератором."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+
+    def register_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT))
+
+    def stream(self, rows):
+        yield self.build(rows)
+
+    async def astream(self, rows):
+        rows = [row async for row in rows]
+        # Сборка PDF занимает процессор: не в цикле событий.
+        yield await sync_to_async(self.build, thread_sensitive=False)(rows)
+
+    def build(self, rows):
+        self.register_font()
+        buffer = io.BytesIO()
+        page = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        line_height = self.font_size * 1.5
+        page.setFont(self.font_name, self.font_size + 4)
+        y = height - self.margin
+        page.drawString(self.margin, y, SHOPPING_LIST_TITLE)
+        page.setFont(self.font_name, self.font_size)
+        for row in rows:
+            y -= line_height
+            if y < self.margin:
+                page.showPage()
+                page.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            page.drawString(
+                self.margin, y,
+                f"• {row['ingredients__name']} - "
+                f"{row['amount']} {row['ingredients__measurement_unit']}"
+            )
+        page.save()
+        return buffer.getvalue()
@@ -0,0 +1,177 @@
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Отставание реплики PostgreSQL в секундах; 0, если всё применено.
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()'
+    ' THEN 0 ELSE EXTRACT(EPOCH FROM now()'
+    ' - pg_last_xact_replay_timestamp()) END'
+)
+
+_read_db = ContextVar('read_db', default=None)
+
+
+class ReplicaSet:
+    """Состояние реплик процесса: доступность и отставание.
+
+    Проверяется не чаще раза в DB_REPLICA_CHECK_INTERVAL; реплики,
+    которые недоступны или отстают больше DB_REPLICA_MAX_LAG, выводятся
+    из ротации.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self.status = {}
+
+    def check(self, alias):
+        try:
+            connection = connections[alias]
+            if connection.vendor != 'postgresql':
+                connection.ensure_connection()
+                return 0.0
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+            return float(lag or 0)
+        except DatabaseError:
+            connections[alias].close()
+            return None
+
+    def refresh(self):
+        self.status = {
+            alias: self.check(alias) for alias in settings.DB_REPLICAS
+        }
+        self._checked_at = time.monotonic()
+
+    def stale(self):
+        return (
+            self._checked_at is None
+            or time.monotonic() - self._checked_at
+            > settings.DB_REPLICA_CHECK_INTERVAL)
+
+    def healthy(self):
+        # Пока один поток проверяет реплики, остальные пользуются
+        # результатом прошлой проверки.
+        if self.stale() and self._lock.acquire(
+                blocking=self._checked_at is None):
+            try:
+                if self.stale():
+                    self.refresh()
+            finally:
+                self._lock.release()
+        return [
+            alias for alias, lag in self.status.items()
+            if lag is not None and lag <= settings.DB_REPLICA_MAX_LAG
+        ]
+
+    def choose(self):
+        """Реплика для чтения или None - читать с основной БД."""
+        healthy = self.healthy()
+        if healthy:
+            return random.choice(healthy)
+        if settings.DB_REPLICA_FALLBACK:
+            return None
+        return random.choice(list(settings.DB_REPLICAS))
+
+
+replica_set = ReplicaSet()
+
+
+def _sticky_key(request):
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if not header:
+        return None
+    digest = hashlib.sha256(header.encode()).hexdigest()
+    return f'replica:sticky:{digest}'
+
+
+class ReplicaRouter:
+    """Чтение с реплики, выбранной ReplicaMiddleware для запроса.
+
+    Вне запросов (команды, фоновые потоки) и для записи используется
+    основная БД. Токены всегда читаются с основной БД: сразу после
+    входа нового токена на реплике может ещё не быть.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label == 'authtoken.Token':
+            return None
+        return _read_db.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему репликацией.
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    """Направляет чтение безопасных запросов к /api/ на реплики.
+
+    Read-your-writes: после успешного небезопасного запроса (избранное,
+    корзина, подписка, рецепт) чтение по тому же токену ещё
+    DB_REPLICA_MAX_LAG секунд идёт с основной БД. Метка хранится в кеше,
+    поэтому для нескольких процессов кеш должен быть общим.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def read_db(self, request):
+        if (not settings.DB_REPLICAS
+                or request.method not in SAFE_METHODS
+                or not request.path.startswith('/api/')
+                # Открытая транзакция должна видеть свои же записи.
+                or connections['default'].in_atomic_block):
+            return None
+        key = _sticky_key(request)
+        if key and caches[settings.REFERENCE_CACHE_ALIAS].get(key):
+            return None
+        return replica_set.choose()
+
+    def after_response(self, request, response):
+        if (settings.DB_REPLICAS and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            key = _sticky_key(request)
+            if key:
+                caches[settings.REFERENCE_CACHE_ALIAS].set(
+                    key, 1, settings.DB_REPLICA_MAX_LAG)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _read_db.set(self.read_db(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_db.reset(token)
+        self.after_response(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _read_db.set(await sync_to_async(self.read_db)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_db.reset(token)
+        await sync_to_async(self.after_response)(request, response)
+        return response
@@ -1,14 +1,18 @@
-import base64
-
-from django.core.files.base import ContentFile
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from foodgram import settings
+from recipes.cart import recipe_changed
+from recipes.images import (VARIANT_FIELDS, ImageTooLarge, decode_data_uri,
+                            schedule_variants)
 from recipes.models import (Favorites, Ingredients, IngredientsRecipes,
-                            Recipes, RecipesTags, ShoppingCart, Tags)
+                            Recipes, ShoppingCart, Tags)
+from recipes.search import highlight
 from rest_framework import serializers
 from users.models import Subscription, User
 
+from .relations import get_user_relations
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Сериализатор для регистрации пользователей"""
@@ -30,14 +34,38 @@ class CustomUserSerializer(UserSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return request.user.is_authenticated and Subscription.objects.filter(
-            user=request.user, following=obj
-        ).exists()
+        return get_user_relations(
+            self.context.get('request')).is_subscribed(obj)
+
+
+class RecipeImageField(serializers.ImageField):
+    """Ссылка на вариант картинки рецепта.
+
+    Пока фоновая обработка не закончилась, отдаётся оригинал.
+    Без явного variant для detail-запроса берётся full, иначе card.
+    """
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def get_variant(self):
+        if self.variant:
+            return self.variant
+        view = self.context.get('view')
+        if getattr(view, 'action', None) == 'retrieve':
+            return 'full'
+        return 'card'
+
+    def to_representation(self, recipe):
+        image = getattr(recipe, VARIANT_FIELDS[self.get_variant()])
+        return super().to_representation(image or recipe.image)
 
 
 class RecipesMiniSerializer(serializers.ModelSerializer):
     """Сериализатор для рецептов в других моделях"""
+    image = RecipeImageField('thumbnail')
+
     class Meta:
         model = Recipes
         fields = ('name', 'image', 'cooking_time', 'id')
@@ -58,7 +86,9 @@ class UserExtendedSerializer(CustomUserSerializer):
             'recipes_limit',
             settings.DEFAULT_RECIPES_LIMIT
         )
-        recipes = obj.recipes.all()[:recipes_limit]
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[:recipes_limit]
         return RecipesMiniSerializer(
             recipes, many=True, context=self.context
         ).data
@@ -152,6 +182,8 @@ class RecipesGetSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = RecipeImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         ordering = ['-pub_date']
@@ -165,37 +197,94 @@ class RecipesGetSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         ]
 
     def get_ingredients(self, obj):
-        ingredients = IngredientsRecipes.objects.filter(recipes=obj)
+        ingredients = obj.ingredientsrecipes_set.all()
         return IngredientsRecipesSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        return request.user.is_authenticated and Favorites.objects.filter(
-            user=request.user, recipes_id=obj
-        ).exists()
+        return get_user_relations(
+            self.context.get('request')).is_favorited(obj)
 
     def get_is_in_shopping_cart(self, obj):
+        return get_user_relations(
+            self.context.get('request')).is_in_shopping_cart(obj)
+
+    def get_image_variants(self, obj):
+        """Готовые варианты картинки; пустой словарь, пока они строятся."""
         request = self.context.get('request')
-        return request.user.is_authenticated and ShoppingCart.objects.filter(
-            user=request.user, recipes_id=obj
-        ).exists()
+        variants = {}
+        for variant, field in VARIANT_FIELDS.items():
+            image = getattr(obj, field)
+            if image:
+                variants[variant] = (
+                    request.build_absolute_uri(image.url) if request
+                    else image.url
+                )
+        return variants
+
+
+class RecipesSearchSerializer(RecipesGetSerializer):
+    """Результат поиска: рецепт, релевантность и выделенные совпадения."""
+    search_rank = serializers.FloatField(read_only=True)
+    highlight = serializers.SerializerMethodField()
+
+    class Meta(RecipesGetSerializer.Meta):
+        fields = RecipesGetSerializer.Meta.fields + [
+            'search_rank', 'highlight']
+
+    def get_highlight(self, obj):
+        query = self.context['request'].query_params.get('search', '')
+        return {
+            'name': highlight(obj.name, query),
+            'text': highlight(obj.text, query, length=200),
+        }
+
+
+class RecipesMatchSerializer(RecipesGetSerializer):
+    """Рецепт, подобранный по ингредиентам пользователя.
+
+    context: owned_ingredients - id имеющихся ингредиентов.
+    """
+    coverage = serializers.SerializerMethodField()
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipesGetSerializer.Meta):
+        fields = RecipesGetSerializer.Meta.fields + [
+            'coverage', 'missing_ingredients']
+
+    def get_coverage(self, obj):
+        ingredients = obj.ingredientsrecipes_set.all()
+        owned = self.context['owned_ingredients']
+        have = sum(row.ingredients_id in owned for row in ingredients)
+        return round(have / len(ingredients), 2) if ingredients else 0
+
+    def get_missing_ingredients(self, obj):
+        owned = self.context['owned_ingredients']
+        return IngredientsRecipesSerializer([
+            row for row in obj.ingredientsrecipes_set.all()
+            if row.ingredients_id not in owned
+        ], many=True).data
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                data = decode_data_uri(data)
+            except ImageTooLarge as error:
+                raise serializers.ValidationError(
+                    f'Слишком большая картинка: {error}.')
+            except ValueError:
+                raise serializers.ValidationError(
+                    'Картинка повреждена.')
         return super().to_internal_value(data)
 
 
-@transaction.atomic
 class RecipesWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для создания, изменения и удаления рецептов."""
     ingredients = AddIngredientsRecipesSerializer(many=True)
@@ -219,35 +308,77 @@ class RecipesWriteSerializer(serializers.ModelSerializer):
         read_only_fields = ['author']
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
-        list = []
+        ingredients = data.get('ingredients')
+        if ingredients is None:
+            return data
+        ids = []
         for ingredient in ingredients:
-            amount = ingredient['amount']
-            if int(amount) < 1:
+            if ingredient['amount'] < 1:
                 raise serializers.ValidationError(
                     {
                         'amount': 'Количество ингредиента не может быть 0'
                     }
                 )
-            if ingredient['id'] in list:
+            if ingredient['id'] in ids:
                 raise serializers.ValidationError(
                     {
                         'ingredient': 'Ингредиенты не должны повторяться'
                     }
                 )
-            list.append(ingredient['id'])
+            ids.append(ingredient['id'])
+        known = self.context.get('known_ingredients')
+        if known is None:
+            known = Ingredients.objects.in_bulk(ids).keys()
+        missing = set(ids) - known
+        if missing:
+            raise serializers.ValidationError(
+                {
+                    'ingredients': 'Ингредиенты не найдены: '
+                    + ', '.join(map(str, sorted(missing)))
+                }
+            )
         return data
 
-    @transaction.atomic
     def create_ingredients(self, ingredients, recipe):
-        ingredients = [
+        IngredientsRecipes.objects.bulk_create(
             IngredientsRecipes(
                 recipes=recipe,
-                ingredients=Ingredients.objects.get(id=ingredient['id']),
+                ingredients_id=ingredient['id'],
                 amount=ingredient['amount'])
             for ingredient in ingredients
-        ]
-        IngredientsRecipes.objects.bulk_create(ingredients)
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """Применяет к рецепту только изменившиеся ингредиенты.
+
+        Возвращает состав рецепта до и после изменения.
+        """
+        current = {
+            row.ingredients_id: row
+            for row in recipe.ingredientsrecipes_set.all()
+        }
+        old_amounts = {key: row.amount for key, row in current.items()}
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            IngredientsRecipes.objects.filter(
+                recipes=recipe, ingredients_id__in=removed).delete()
+        changed = []
+        for key, row in current.items():
+            if key in new_amounts and row.amount != new_amounts[key]:
+                row.amount = new_amounts[key]
+                changed.append(row)
+        if changed:
+            IngredientsRecipes.objects.bulk_update(changed, ['amount'])
+        self.create_ingredients(
+            [ingredient for ingredient in ingredients
+             if ingredient['id'] not in current],
+            recipe
+        )
+        return old_amounts, new_amounts
 
     @transaction.atomic
     def create(self, validated_data):
@@ -257,25 +388,51 @@ class RecipesWriteSerializer(serializers.ModelSerializer):
         recipe = Recipes.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        schedule_variants(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        RecipesTags.objects.filter(recipes=instance).delete()
-        IngredientsRecipes.objects.filter(recipes=instance).delete()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        self.create_ingredients(ingredients, instance)
-        self.create_tags(tags, instance)
-        instance.name = validated_data.pop('name')
-        instance.text = validated_data.pop('text')
-        if validated_data.get('image'):
-            instance.image = validated_data.pop('image')
-        instance.cooking_time = validated_data.pop('cooking_time')
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            recipe_changed(
+                instance.id, *self.update_ingredients(ingredients, instance))
+        if not validated_data.get('image'):
+            validated_data.pop('image', None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
         instance.save()
+        if 'image' in validated_data:
+            schedule_variants(instance)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags',
+            Prefetch('ingredientsrecipes_set',
+                     queryset=IngredientsRecipes.objects.select_related(
+                         'ingredients'))
+        )
         return RecipesGetSerializer(instance, context={
             'request': self.context.get('request')
         }).data
+
+
+class RecipesImportSerializer(RecipesWriteSerializer):
+    """Проверка строки массового импорта рецептов.
+
+    Правила те же, что у RecipesWriteSerializer, но теги и ингредиенты
+    сверяются с множествами id, загруженными заранее на всю пачку строк
+    (context: known_tags, known_ingredients).
+    """
+    tags = serializers.ListField(child=serializers.IntegerField())
+
+    def validate_tags(self, tags):
+        missing = set(tags) - self.context['known_tags']
+        if missing:
+            raise serializers.ValidationError(
+                'Теги не найдены: ' + ', '.join(map(str, sorted(missing))))
+        return tags
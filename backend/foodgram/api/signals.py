@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredients, Tags
+from recipes.signals import ingredients_imported
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .authentication import forget_tokens
+from .cache import bump_version
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+def tags_changed(sender, **kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+@receiver(ingredients_imported)
+def ingredients_changed(sender, **kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    if not created:
+        forget_tokens(Token.objects.filter(
+            user=instance).values_list('key', flat=True))
@@ -0,0 +1,108 @@
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from recipes.models import Favorites, Recipes
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+from .replicas import replica_set
+
+REPLICA = 'replica_0'
+
+
+@override_settings(DB_REPLICAS=[REPLICA], FEED_WORKERS=0,
+                   PROFILING_SAMPLE_RATE=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Маршрутизация ReplicaRouter и ReplicaMiddleware.
+
+    Реплика - второе соединение к тестовой БД, которое добавляется
+    на время тестов класса. TestCase не подходит: внутри его транзакции
+    ReplicaMiddleware читает с основной БД.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        default = connections['default'].settings_dict
+        connections.settings[REPLICA] = {
+            **default, 'TEST': {**default['TEST'], 'MIRROR': 'default'}}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        super().tearDownClass()
+
+    def setUp(self):
+        caches['default'].clear()
+        replica_set._checked_at = None
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x')
+        self.recipe = Recipes.objects.create(
+            author=User.objects.create_user(
+                username='author', email='author@example.com', password='x'),
+            name='Каша', text='Сварить', cooking_time=10,
+            image='recipes/images/synthetic.png')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+
+    def aliases(self, method, url):
+        """Псевдонимы БД, к которым обращался запрос."""
+        used = []
+
+        def track(execute, sql, params, many, context):
+            used.append(context['connection'].alias)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(track))
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400, response.content)
+        return set(used)
+
+    def login(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_anonymous_read_uses_replica(self):
+        self.assertEqual(self.aliases('get', '/api/recipes/'), {REPLICA})
+
+    def test_token_is_read_from_default(self):
+        self.login()
+        self.assertEqual(
+            self.aliases('get', '/api/recipes/'), {'default', REPLICA})
+
+    def test_write_uses_default(self):
+        self.login()
+        self.assertEqual(
+            self.aliases('post', f'/api/recipes/{self.recipe.id}/favorite/'),
+            {'default'})
+        self.assertTrue(Favorites.objects.filter(
+            user=self.user, recipes=self.recipe).exists())
+
+    def test_read_after_write_sticks_to_default(self):
+        self.login()
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(
+            self.aliases('get', '/api/recipes/?is_favorited=1'),
+            {'default'})
+        # Метка действует только для токена, который писал.
+        self.client.credentials()
+        self.assertEqual(self.aliases('get', '/api/recipes/'), {REPLICA})
+
+    def test_read_returns_to_replica_when_mark_expires(self):
+        self.login()
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        caches['default'].clear()
+        self.assertIn(
+            REPLICA, self.aliases('get', '/api/recipes/?is_favorited=1'))
+
+    def test_unavailable_replica_falls_back_to_default(self):
+        with mock.patch.object(replica_set, 'check', return_value=None):
+            self.assertEqual(
+                self.aliases('get', '/api/recipes/'), {'default'})
@@ -1,6 +1,7 @@
 from api.views import (FavoriteView, IngredientsViewSet, RecipesViewSet,
                        ShoppingCartView, SubscriptionsList, TagsViewSet,
                        ToSubscribeView, download_shopping_cart)
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -27,3 +28,17 @@ urlpatterns = [
     path('', include('djoser.urls')),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_VIEWS:
+    from api import async_views
+
+    # Горячие пути чтения под ASGI обслуживаются асинхронно.
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list, name='recipe-list'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipe-detail'),
+        path('recipes/download_shopping_cart/', async_views.shopping_list,
+             name='download_shopping_cart'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredient-list'),
+    ] + urlpatterns
@@ -1,37 +1,78 @@
-from django.db.models import Count, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
 from recipes.models import (Favorites, Ingredients, IngredientsRecipes,
                             Recipes, ShoppingCart, Tags, User)
+from recipes.feed import get_feed
+from recipes.matching import match_recipes
+from recipes.queries import latest_recipes
+from recipes.search import search_ingredients
 from rest_framework import status, viewsets
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view, renderer_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import AllowAny
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from users.models import Subscription
 
-from .filters import CustomRecipeFilter, IngredientFilter
-from .paginator import CustomPagination
+from .cache import CachedReadOnlyMixin
+from .filters import CustomRecipeFilter
+from .importers import RecipesImporter
+from .paginator import CustomPagination, KeysetPagination, RankedPagination
+from .parsers import JSONLinesParser
 from .permissions import IsAuthorOrReadOnlyPermission
+from .profiling import ProfiledViewMixin
+from .renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                        PDFShoppingListRenderer, TextShoppingListRenderer)
 from .serializers import (FavoritesSerializer, IngredientsSerializer,
-                          RecipesGetSerializer, RecipesWriteSerializer,
-                          ShoppingCartSerializer, TagsSerializer,
-                          ToSubscribeSerializer, UserExtendedSerializer)
+                          RecipesGetSerializer, RecipesMatchSerializer,
+                          RecipesSearchSerializer, RecipesWriteSerializer,
+                          ShoppingCartSerializer,
+                          TagsSerializer, ToSubscribeSerializer,
+                          UserExtendedSerializer)
 
 
-class SubscriptionsList(ListAPIView):
+class SubscriptionsList(ProfiledViewMixin, ListAPIView):
     serializer_class = UserExtendedSerializer
     pagination_class = CustomPagination
+    cursor_ordering = ('-id',)
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user).annotate(
-            recipes_count=Count('recipes'))
+        return User.objects.filter(following__user=self.request.user)
 
+    def get_recipes_limit(self):
+        try:
+            return max(int(self.request.query_params['recipes_limit']), 0)
+        except (KeyError, ValueError):
+            return settings.DEFAULT_RECIPES_LIMIT
 
-class ToSubscribeView(APIView):
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['recipes_limit'] = self.get_recipes_limit()
+        return context
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            # Рецепты всех авторов страницы одним запросом.
+            prefetch_related_objects(page, Prefetch(
+                'recipes',
+                queryset=latest_recipes(
+                    (user.id for user in page), self.get_recipes_limit()),
+                to_attr='latest_recipes'
+            ))
+        return page
+
+
+class ToSubscribeView(ProfiledViewMixin, APIView):
 
+    @transaction.atomic
     def post(self, request, id):
         data = {
             'user': request.user.id,
@@ -46,6 +87,7 @@ class ToSubscribeView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
     def delete(self, request, id):
         following = get_object_or_404(User, id=id)
         if Subscription.objects.filter(
@@ -58,35 +100,63 @@ class ToSubscribeView(APIView):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(ProfiledViewMixin, CachedReadOnlyMixin,
+                  viewsets.ReadOnlyModelViewSet):
     """ViewSet для доступа к тегам."""
     queryset = Tags.objects.all().order_by("id")
     serializer_class = TagsSerializer
     http_method_names = ['get']
     pagination_class = None
+    authentication_classes = []
     permission_classes = [AllowAny]
+    cache_resource = 'tags'
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
-    """ViewSet для доступа к тегам."""
+class IngredientsViewSet(ProfiledViewMixin, CachedReadOnlyMixin,
+                         viewsets.ReadOnlyModelViewSet):
+    """ViewSet для доступа к ингредиентам.
+
+    Поиск по ?name= обслуживается индексом в памяти процесса.
+    """
     queryset = Ingredients.objects.all().order_by("id")
     serializer_class = IngredientsSerializer
     http_method_names = ['get']
-    filter_backends = [IngredientFilter]
-    search_fields = ['^name']
+    authentication_classes = []
     permission_classes = [AllowAny]
+    cache_resource = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        return Response(search_ingredients(
+            request.query_params.get('name', ''), max(limit, 1)))
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ProfiledViewMixin, viewsets.ModelViewSet):
     """ViewSet для доступа к рецептам."""
-    queryset = Recipes.objects.all()
     permission_classes = [IsAuthorOrReadOnlyPermission, ]
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = CustomRecipeFilter
     pagination_class = CustomPagination
+    cursor_ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        return Recipes.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientsrecipes_set',
+                queryset=IngredientsRecipes.objects.select_related(
+                    'ingredients')
+            ),
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
+            if self.action == 'list' and self.request.query_params.get(
+                    'search', '').strip():
+                return RecipesSearchSerializer
             return RecipesGetSerializer
         return RecipesWriteSerializer
 
@@ -95,10 +165,61 @@ class RecipesViewSet(viewsets.ModelViewSet):
         context.update({'request': self.request})
         return context
 
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            pagination_class=KeysetPagination,
+            cursor_ordering=('-feed_date', '-id'))
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        queryset = self.filter_queryset(
+            get_feed(request.user, self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, pagination_class=RankedPagination)
+    def match(self, request):
+        """Рецепты, которые можно приготовить из ингредиентов
+        ?ingredients=1,2,3, если докупить не больше ?missing= из них."""
+        try:
+            owned = {
+                int(pk)
+                for value in request.query_params.getlist('ingredients')
+                for pk in value.split(',') if pk.strip()
+            }
+            max_missing = int(request.query_params.get('missing', 0))
+        except ValueError:
+            raise ValidationError(
+                'ingredients - id через запятую, missing - число.')
+        max_missing = min(max(max_missing, 0),
+                          settings.RECIPE_MATCH_MAX_MISSING)
+        ranked = [pk for pk, _, _ in match_recipes(owned, max_missing)]
+        page = self.paginate_queryset(ranked)
+        recipes = self.get_queryset().in_bulk(page)
+        serializer = RecipesMatchSerializer(
+            [recipes[pk] for pk in page if pk in recipes], many=True,
+            context={**self.get_serializer_context(),
+                     'owned_ingredients': owned})
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAuthenticated],
+            parser_classes=[JSONLinesParser, MultiPartParser])
+    def import_recipes(self, request):
+        """Массовый импорт рецептов текущего пользователя из JSON Lines:
+        тело application/x-ndjson или файл в поле file."""
+        lines = request.FILES.get('file') or request.data
+        try:
+            batch_size = int(request.query_params['batch_size'])
+        except (KeyError, ValueError):
+            batch_size = None
+        report = RecipesImporter(request.user, batch_size).run(lines)
+        return Response(report)
 
-class FavoriteView(APIView):
+
+class FavoriteView(ProfiledViewMixin, APIView):
     # pagination_class = CustomPagination
 
+    @transaction.atomic
     def post(self, request, id):
         data = {
             'user': request.user.id,
@@ -116,6 +237,7 @@ class FavoriteView(APIView):
                 )
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
     def delete(self, request, id):
         recipes = get_object_or_404(Recipes, id=id)
         if Favorites.objects.filter(
@@ -126,8 +248,9 @@ class FavoriteView(APIView):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class ShoppingCartView(APIView):
+class ShoppingCartView(ProfiledViewMixin, APIView):
 
+    @transaction.atomic
     def post(self, request, id):
         data = {
             'user': request.user.id,
@@ -142,6 +265,7 @@ class ShoppingCartView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
     def delete(self, request, id):
         recipes = get_object_or_404(Recipes, id=id)
         if ShoppingCart.objects.filter(
@@ -154,22 +278,40 @@ class ShoppingCartView(APIView):
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
-def download_shopping_cart(request):
-    shopping_list = "Список покупок:"
-    ingredients = IngredientsRecipes.objects.filter(
-        recipes__shopping__user=request.user
-    ).values(
-        'ingredients__name', 'ingredients__measurement_unit'
-    ).annotate(amount=Sum('amount'))
-    for num, i in enumerate(ingredients):
-        shopping_list += (
-            f"\n{i['ingredients__name']} - "
-            f"{i['amount']} {i['ingredients__measurement_unit']}"
+def shopping_list_response(request, renderer, cart_version,
+                           asynchronous=False):
+    """Список покупок потоком или 304, если он не изменился.
+
+    В асинхронном представлении строки читаются aiterator() и
+    отдаются renderer.astream(), в синхронном - iterator() и stream().
+    """
+    etag = f'"{request.user.id}-{cart_version}-{renderer.format}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        ingredients = request.user.cart_ingredients.values(
+            'ingredients__name', 'ingredients__measurement_unit', 'amount'
+        ).order_by('ingredients__name')
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.astream(ingredients.aiterator()) if asynchronous
+            else renderer.stream(ingredients.iterator()),
+            content_type=content_type
         )
-        if num < ingredients.count() - 1:
-            shopping_list += ', '
-    filename = "shopping_list.txt"
-    response = HttpResponse(shopping_list, 'Content-Type: application/txt')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        filename = f'shopping_list.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
     return response
+
+
+@api_view(['GET'])
+@renderer_classes([TextShoppingListRenderer, CSVShoppingListRenderer,
+                   JSONShoppingListRenderer, PDFShoppingListRenderer])
+def download_shopping_cart(request):
+    # request.user может быть из кеша аутентификации, версия - из БД.
+    cart_version = User.objects.values_list(
+        'cart_version', flat=True).get(pk=request.user.pk)
+    return shopping_list_response(
+        request, request.accepted_renderer, cart_version)
@@ -0,0 +1,20 @@
+"""ASGI-точка входа.
+
+Запуск: gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker
+Горячие пути чтения обслуживаются асинхронными представлениями
+(ASYNC_VIEWS), остальные - синхронными, как под WSGI.
+
+Постоянные соединения с БД под ASGI по умолчанию выключены
+(DB_CONN_MAX_AGE=0), как требует документация Django: соединения
+остаются в потоках asgiref и не закрываются вовремя. Для пула
+соединений - PgBouncer.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+application = get_asgi_application()
@@ -33,6 +33,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,15 +62,67 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+DB_ENGINE = os.getenv('DB_ENGINE', default='django.db.backends.postgresql')
+DB_OPTIONS = {}
+if DB_ENGINE == 'django.db.backends.postgresql':
+    DB_OPTIONS['connect_timeout'] = int(
+        os.getenv('DB_CONNECT_TIMEOUT', default=5))
+    # Предел выполнения одного запроса в мс, 0 - без предела.
+    DB_OPTIONS['options'] = (
+        f"-c statement_timeout={os.getenv('DB_STATEMENT_TIMEOUT', 0)}")
 
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': DB_ENGINE,
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default=None),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default=None),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=None)
+        'PORT': os.getenv('DB_PORT', default=None),
+        # Соединение переиспользуется запросами потока столько секунд;
+        # 0 - новое соединение на каждый запрос (по умолчанию под ASGI,
+        # см. foodgram/asgi.py).
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        # Проверять постоянное соединение в начале запроса.
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', default='True') == 'True',
+        # Нужно за PgBouncer в режиме transaction.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', default='False') == 'True',
+        'OPTIONS': DB_OPTIONS,
+    }
+}
+# Реплики для чтения (api/replicas.py): через запятую HOST каждой
+# реплики, для SQLite - путь к файлу БД; остальное берётся из default.
+DB_REPLICAS = []
+for number, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(','))):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if DB_ENGINE == 'django.db.backends.sqlite3' else 'HOST': (
+            location.strip()),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DB_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+# Допустимое отставание реплики в секундах. На столько же чтение после
+# записи закрепляется за основной БД.
+DB_REPLICA_MAX_LAG = int(os.getenv('DB_REPLICA_MAX_LAG', default=5))
+DB_REPLICA_CHECK_INTERVAL = int(
+    os.getenv('DB_REPLICA_CHECK_INTERVAL', default=5))
+# Читать с основной БД, если ни одна реплика не годится.
+DB_REPLICA_FALLBACK = os.getenv(
+    'DB_REPLICA_FALLBACK', default='True') == 'True'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -103,12 +157,107 @@ DJOSER = {
 
 DEFAULT_RECIPES_LIMIT = 3
 
+INGREDIENT_INDEX_ENABLED = os.getenv(
+    'INGREDIENT_INDEX_ENABLED', default='True') == 'True'
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default=300))
+INGREDIENT_SEARCH_LIMIT = 50
+
+# Полнотекстовый поиск рецептов: на PostgreSQL - по search_vector,
+# на других БД - по индексу в памяти процесса.
+RECIPE_SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_MAX_RESULTS = 1000
+RECIPE_INDEX_TTL = int(os.getenv('RECIPE_INDEX_TTL', default=60))
+
+# Подбор рецептов по имеющимся ингредиентам (recipes/matching.py).
+RECIPE_MATCH_INDEX_TTL = int(
+    os.getenv('RECIPE_MATCH_INDEX_TTL', default=10 * 60))
+RECIPE_MATCH_MAX_MISSING = 5
+RECIPE_MATCH_MAX_RESULTS = 1000
+
+RECIPES_IMPORT_BATCH_SIZE = 500
+
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', default=500))
+# Рецепты авторов с большим числом подписчиков не рассылаются по лентам,
+# а подмешиваются при чтении.
+FEED_PUSH_MAX_FOLLOWERS = int(
+    os.getenv('FEED_PUSH_MAX_FOLLOWERS', default=10_000))
+FEED_FANOUT_BATCH_SIZE = 1000
+# 0 - рассылать по лентам синхронно, сразу после коммита.
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', default=1))
+
+IMAGE_VARIANTS = {
+    'thumbnail': (240, 240),
+    'card': (640, 640),
+    'full': (1600, 1600),
+}
+IMAGE_VARIANT_FORMAT = os.getenv('IMAGE_VARIANT_FORMAT', default='WEBP')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', default=40_000_000))
+# 0 - строить варианты синхронно, сразу после коммита.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+# Файлы моложе этого срока (в секундах) не удаляются как неиспользуемые.
+MEDIA_GC_GRACE = int(os.getenv('MEDIA_GC_GRACE', default=60 * 60))
+
+# С кешем в памяти процесса (LocMemCache) ответы справочников и их
+# версии живут не дольше REFERENCE_CACHE_MAX_AGE (см. api/cache.py).
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_CACHE_TIMEOUT', default=60 * 60))
+REFERENCE_CACHE_MAX_AGE = int(
+    os.getenv('REFERENCE_CACHE_MAX_AGE', default=60))
+
+# Доля запросов, для которых ProfilingMiddleware собирает метрики
+# (0 - выключено). Отчёты пишутся в PROFILING_LOG_FILE или в stderr.
+PROFILING_SAMPLE_RATE = float(
+    os.getenv('PROFILING_SAMPLE_RATE', default=0.01))
+PROFILING_LOG_FILE = os.getenv('PROFILING_LOG_FILE', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'profiling': {
+            'class': (
+                'logging.handlers.WatchedFileHandler' if PROFILING_LOG_FILE
+                else 'logging.StreamHandler'),
+            **({'filename': PROFILING_LOG_FILE} if PROFILING_LOG_FILE
+               else {}),
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'foodgram.profiling': {
+            'handlers': ['profiling'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Асинхронные представления горячих путей (api/async_views.py);
+# включаются в foodgram/asgi.py.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False') == 'True'
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Кеш пользователей по токену (api/authentication.py): LRU процесса
+# и, если задан псевдоним, общий кеш.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10_000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=60))
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS', default='')
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -118,8 +267,6 @@ TIME_ZONE = 'UTC'
 
 USE_I18N = True
 
-USE_L10N = True
-
 USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
@@ -129,3 +276,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+STORAGES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'DEFAULT_FILE_STORAGE',
+            default='recipes.storage.ContentAddressedStorage'),
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
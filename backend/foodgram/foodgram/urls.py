@@ -1,7 +1,9 @@
+from api.profiling import metrics
 from django.contrib import admin
 from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls', namespace='api')),
+    path('metrics', metrics, name='metrics'),
 ]
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
+from .cart import recipe_amounts, recipe_changed
+from .images import schedule_variants
 from .models import (Favorites, Ingredients, IngredientsRecipes, Recipes,
-                     RecipesTags, ShoppingCart, Tags)
+                     RecipesTags, ShoppingCart, ShoppingCartIngredients, Tags)
 
 
 class IngredientsRecipesInline(admin.TabularInline):
@@ -20,8 +22,21 @@ class RecipesAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     inlines = [IngredientsRecipesInline, RecipesTagsInline]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            schedule_variants(obj)
+
+    def save_related(self, request, form, formsets, change):
+        if not change:
+            super().save_related(request, form, formsets, change)
+            return
+        old_amounts = recipe_amounts(form.instance.id)
+        super().save_related(request, form, formsets, change)
+        recipe_changed(form.instance.id, old_amounts)
+
     def view_favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
     view_favorite_count.short_description = 'Всего в избранном'
 
 
@@ -55,6 +70,12 @@ class FavoritesAdmin(admin.ModelAdmin):
     list_filter = ('user', 'recipes')
 
 
+@admin.register(ShoppingCartIngredients)
+class ShoppingCartIngredientsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredients', 'amount')
+    list_filter = ('user',)
+
+
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipes')
@@ -0,0 +1,16 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    """Пул потоков процесса с префиксом name, создаётся при первом
+    обращении."""
+    if name not in _executors:
+        with _lock:
+            if name not in _executors:
+                _executors[name] = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix=name)
+    return _executors[name]
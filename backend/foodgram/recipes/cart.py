@@ -0,0 +1,165 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from users.models import User
+
+from .models import IngredientsRecipes, ShoppingCart, ShoppingCartIngredients
+
+
+def recipe_amounts(recipes_id):
+    """Количество каждого ингредиента в рецепте: {ingredients_id: amount}."""
+    return dict(IngredientsRecipes.objects.filter(
+        recipes_id=recipes_id).values_list('ingredients_id', 'amount'))
+
+
+def touch_shopping_carts(users_ids):
+    """Меняет версию списка покупок у пользователей."""
+    User.objects.filter(pk__in=users_ids).update(
+        cart_version=F('cart_version') + 1)
+
+
+def apply_amounts(users_ids, amounts, attempts=3):
+    """Прибавляет amounts к сводным спискам покупок пользователей.
+
+    Отрицательные значения вычитаются, строки с нулевым остатком
+    удаляются. select_for_update не блокирует ещё не созданные строки:
+    если параллельная транзакция успела вставить ту же строку, попытка
+    повторяется и строка уже обновляется.
+    """
+    amounts = {key: value for key, value in amounts.items() if value}
+    if not users_ids or not amounts:
+        return
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                _apply_amounts(users_ids, amounts)
+            return
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+def _apply_amounts(users_ids, amounts):
+    rows = {
+        (row.user_id, row.ingredients_id): row
+        for row in ShoppingCartIngredients.objects.select_for_update().filter(
+            user_id__in=users_ids, ingredients_id__in=amounts)
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in users_ids:
+        for ingredients_id, amount in amounts.items():
+            row = rows.get((user_id, ingredients_id))
+            if row is None:
+                if amount > 0:
+                    to_create.append(ShoppingCartIngredients(
+                        user_id=user_id, ingredients_id=ingredients_id,
+                        amount=amount))
+                continue
+            row.amount += amount
+            if row.amount > 0:
+                to_update.append(row)
+            else:
+                to_delete.append(row.pk)
+    ShoppingCartIngredients.objects.bulk_create(to_create)
+    ShoppingCartIngredients.objects.bulk_update(to_update, ['amount'])
+    ShoppingCartIngredients.objects.filter(pk__in=to_delete).delete()
+    touch_shopping_carts(users_ids)
+
+
+def recipe_added(user_id, recipes_id, sign=1):
+    """Учитывает добавление (sign=1) или удаление (sign=-1) рецепта."""
+    apply_amounts([user_id], {
+        ingredients_id: sign * amount
+        for ingredients_id, amount in recipe_amounts(recipes_id).items()
+    })
+
+
+def recipe_changed(recipes_id, old_amounts, new_amounts=None):
+    """Переносит изменение состава рецепта в списки покупок.
+
+    old_amounts - результат recipe_amounts() до изменения; new_amounts,
+    если не передан, читается из базы.
+    """
+    if new_amounts is None:
+        new_amounts = recipe_amounts(recipes_id)
+    delta = {
+        ingredients_id: (new_amounts.get(ingredients_id, 0)
+                         - old_amounts.get(ingredients_id, 0))
+        for ingredients_id in old_amounts.keys() | new_amounts.keys()
+    }
+    if not any(delta.values()):
+        return
+    users_ids = list(ShoppingCart.objects.filter(
+        recipes_id=recipes_id).values_list('user_id', flat=True))
+    apply_amounts(users_ids, delta)
+
+
+def recipe_deleted(recipes_id):
+    """Убирает удаляемый рецепт из сводных списков всех его корзин.
+
+    Вызывается до каскадного удаления, одним пересчётом на рецепт, а не
+    на каждую строку корзины.
+    """
+    recipe_changed(recipes_id, recipe_amounts(recipes_id), {})
+
+
+def expected_totals(users_ids=None):
+    """Сводные списки, посчитанные заново по корзинам и рецептам."""
+    queryset = ShoppingCart.objects.all()
+    if users_ids is not None:
+        queryset = queryset.filter(user_id__in=users_ids)
+    rows = queryset.filter(
+        recipes__ingredientsrecipes__isnull=False
+    ).values_list(
+        'user_id', 'recipes__ingredientsrecipes__ingredients_id'
+    ).annotate(
+        total=Sum('recipes__ingredientsrecipes__amount')
+    ).order_by()
+    totals = defaultdict(dict)
+    for user_id, ingredients_id, total in rows.iterator():
+        totals[user_id][ingredients_id] = total
+    return totals
+
+
+def stored_totals(users_ids=None):
+    """Сводные списки в том виде, в котором они хранятся в базе."""
+    queryset = ShoppingCartIngredients.objects.all()
+    if users_ids is not None:
+        queryset = queryset.filter(user_id__in=users_ids)
+    totals = defaultdict(dict)
+    for user_id, ingredients_id, amount in queryset.values_list(
+            'user_id', 'ingredients_id', 'amount').iterator():
+        totals[user_id][ingredients_id] = amount
+    return totals
+
+
+def find_mismatches(users_ids=None):
+    """Возвращает id пользователей с расхождениями в сводном списке."""
+    expected = expected_totals(users_ids)
+    stored = stored_totals(users_ids)
+    return sorted(
+        user_id for user_id in expected.keys() | stored.keys()
+        if expected.get(user_id) != stored.get(user_id)
+    )
+
+
+@transaction.atomic
+def rebuild_totals(users_ids=None, batch_size=1000):
+    """Пересобирает сводные списки покупок с нуля."""
+    queryset = ShoppingCartIngredients.objects.all()
+    if users_ids is not None:
+        queryset = queryset.filter(user_id__in=users_ids)
+    queryset.delete()
+    totals = expected_totals(users_ids)
+    ShoppingCartIngredients.objects.bulk_create((
+        ShoppingCartIngredients(
+            user_id=user_id, ingredients_id=ingredients_id, amount=amount)
+        for user_id, amounts in totals.items()
+        for ingredients_id, amount in amounts.items()
+    ), batch_size=batch_size)
+    if users_ids is None:
+        User.objects.update(cart_version=F('cart_version') + 1)
+    else:
+        touch_shopping_carts(users_ids)
+    return sum(len(amounts) for amounts in totals.values())
@@ -0,0 +1,43 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from users.models import Subscription, User
+
+from .models import Favorites, Recipes, ShoppingCart
+
+# (модель со счётчиком, поле счётчика, считаемая модель, внешний ключ)
+COUNTERS = (
+    (Recipes, 'favorites_count', Favorites, 'recipes'),
+    (Recipes, 'cart_count', ShoppingCart, 'recipes'),
+    (User, 'recipes_count', Recipes, 'author'),
+    (User, 'followers_count', Subscription, 'following'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def actual_count(source, fk):
+    return Coalesce(Subquery(
+        source.objects.filter(
+            **{fk: OuterRef('pk')}
+        ).order_by().values(fk).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def reconcile_counters(fix=True):
+    """Сверяет счётчики с фактическими данными.
+
+    Возвращает {поле: число расхождений}; при fix=True исправляет их.
+    """
+    drift = {}
+    for model, field, source, fk in COUNTERS:
+        drifted = model.objects.annotate(
+            actual=actual_count(source, fk)
+        ).exclude(**{field: F('actual')})
+        drift[field] = drifted.count()
+        if fix and drift[field]:
+            model.objects.filter(
+                pk__in=drifted.values('pk')
+            ).update(**{field: actual_count(source, fk)})
+    return drift
@@ -0,0 +1,161 @@
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q
+from users.models import Subscription, User
+
+from .background import get_executor
+from .models import FeedEntry, Recipes
+
+logger = logging.getLogger(__name__)
+
+
+def is_push_author(author_id):
+    return User.objects.filter(
+        pk=author_id,
+        followers_count__lte=settings.FEED_PUSH_MAX_FOLLOWERS
+    ).exists()
+
+
+def trim_feeds(users_ids):
+    """Оставляет в лентах пользователей FEED_MAX_LENGTH новых записей.
+
+    Обрезаются только ленты, которые вышли за этот предел.
+    """
+    users_ids = list(FeedEntry.objects.filter(
+        user_id__in=list(users_ids)
+    ).values('user_id').annotate(
+        total=Count('id')
+    ).filter(
+        total__gt=settings.FEED_MAX_LENGTH
+    ).values_list('user_id', flat=True).order_by())
+    if not users_ids:
+        return
+    table = connection.ops.quote_name(FeedEntry._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(users_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f' SELECT id FROM ('
+            f'  SELECT id, ROW_NUMBER() OVER ('
+            f'   PARTITION BY user_id ORDER BY pub_date DESC, recipes_id DESC'
+            f'  ) AS position FROM {table} WHERE user_id IN ({placeholders})'
+            f' ) AS ranked WHERE position > %s)',
+            [*users_ids, settings.FEED_MAX_LENGTH]
+        )
+
+
+def _run_in_background(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception(
+            'Не удалось обновить ленты: %s%r', func.__name__, args)
+    finally:
+        # У рабочего потока своё соединение с БД.
+        connection.close()
+
+
+def schedule(func, *args):
+    """Выполняет func(*args) после коммита транзакции.
+
+    Рассылка по лентам не держит транзакцию запроса: при FEED_WORKERS > 0
+    она идёт в фоновом потоке, иначе - сразу после коммита.
+    """
+    if settings.FEED_WORKERS:
+        transaction.on_commit(lambda: get_executor(
+            'feeds', settings.FEED_WORKERS
+        ).submit(_run_in_background, func, *args))
+    else:
+        transaction.on_commit(lambda: func(*args))
+
+
+def fan_out(recipes):
+    """Добавляет новые рецепты в ленты подписчиков их авторов.
+
+    Авторов с числом подписчиков больше FEED_PUSH_MAX_FOLLOWERS
+    пропускает: их рецепты подмешиваются при чтении ленты.
+    """
+    by_author = {}
+    for recipe in recipes:
+        by_author.setdefault(recipe.author_id, []).append(recipe)
+    push_authors = User.objects.filter(
+        pk__in=by_author,
+        followers_count__lte=settings.FEED_PUSH_MAX_FOLLOWERS
+    ).values_list('pk', flat=True)
+    for author_id in push_authors:
+        followers = Subscription.objects.filter(
+            following_id=author_id
+        ).values_list('user_id', flat=True).iterator()
+        batch = list(islice(followers, settings.FEED_FANOUT_BATCH_SIZE))
+        while batch:
+            FeedEntry.objects.bulk_create((
+                FeedEntry(user_id=user_id, recipes_id=recipe.pk,
+                          author_id=author_id, pub_date=recipe.pub_date)
+                for user_id in batch
+                for recipe in by_author[author_id]
+            ), ignore_conflicts=True)
+            trim_feeds(batch)
+            batch = list(islice(followers, settings.FEED_FANOUT_BATCH_SIZE))
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними рецептами автора после подписки."""
+    if not is_push_author(author_id) or not Subscription.objects.filter(
+            user_id=user_id, following_id=author_id).exists():
+        return
+    FeedEntry.objects.bulk_create((
+        FeedEntry(user_id=user_id, recipes_id=pk,
+                  author_id=author_id, pub_date=pub_date)
+        for pk, pub_date in Recipes.objects.filter(
+            author_id=author_id
+        ).order_by('-pub_date', '-id').values_list(
+            'pk', 'pub_date')[:settings.FEED_MAX_LENGTH]
+    ), ignore_conflicts=True)
+    trim_feeds([user_id])
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def resume_push(author_id):
+    """Рассылает рецепты, опубликованные, пока автор был в режиме чтения.
+
+    Вызывается, когда число подписчиков снова опустилось до
+    FEED_PUSH_MAX_FOLLOWERS: лента таких авторов дальше читается
+    только из FeedEntry, и без рассылки эти рецепты из неё пропали бы.
+    """
+    if not is_push_author(author_id):
+        return
+    last_pushed = FeedEntry.objects.filter(
+        author_id=author_id).aggregate(last=Max('pub_date'))['last']
+    recipes = Recipes.objects.filter(author_id=author_id)
+    if last_pushed is not None:
+        recipes = recipes.filter(pub_date__gt=last_pushed)
+    fan_out(list(recipes.order_by('-pub_date', '-id').only(
+        'author_id', 'pub_date')[:settings.FEED_MAX_LENGTH]))
+
+
+def get_feed(user, queryset=None):
+    """Рецепты ленты пользователя с полем feed_date для сортировки.
+
+    Если пользователь не подписан на авторов, рецепты которых
+    подмешиваются при чтении, лента читается одним диапазоном
+    индекса feed_user_pub_date.
+    """
+    if queryset is None:
+        queryset = Recipes.objects.all()
+    pull_authors = Subscription.objects.filter(
+        user=user,
+        following__followers_count__gt=settings.FEED_PUSH_MAX_FOLLOWERS
+    ).values('following_id')
+    if not pull_authors.exists():
+        return queryset.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'))
+    return queryset.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('recipes_id'))
+        | Q(author_id__in=pull_authors)
+    ).annotate(feed_date=F('pub_date'))
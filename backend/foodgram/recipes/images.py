@@ -0,0 +1,187 @@
+import base64
+import io
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import connection, transaction
+from django.db.models import Q
+from PIL import Image
+
+from .background import get_executor
+from .models import Recipes
+
+logger = logging.getLogger(__name__)
+
+# Варианты картинки рецепта и поля модели, в которых они хранятся.
+VARIANT_FIELDS = {
+    'thumbnail': 'image_thumbnail',
+    'card': 'image_card',
+    'full': 'image_full',
+}
+IMAGE_FIELDS = ('image', *VARIANT_FIELDS.values())
+VARIANT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+# Кратно 4, чтобы каждый кусок base64 декодировался независимо.
+DECODE_CHUNK_SIZE = 4 * 64 * 1024
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def decode_data_uri(data):
+    """Декодирует data:image/...;base64 в файл.
+
+    Строка декодируется кусками, а результат уходит на диск, как только
+    превысит FILE_UPLOAD_MAX_MEMORY_SIZE, поэтому ещё одна полная копия
+    картинки в памяти не появляется. Размеры проверяются по заголовку
+    файла без распаковки пикселей.
+    """
+    header, payload = data.split(';base64,', 1)
+    if any(char.isspace() for char in payload[:DECODE_CHUNK_SIZE]):
+        payload = ''.join(payload.split())
+    buffer = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    try:
+        for start in range(0, len(payload), DECODE_CHUNK_SIZE):
+            buffer.write(base64.b64decode(
+                payload[start:start + DECODE_CHUNK_SIZE], validate=True))
+        buffer.seek(0)
+        check_dimensions(buffer)
+    except ValueError:
+        buffer.close()
+        raise
+    return File(buffer, name='temp.' + header.split('/')[-1])
+
+
+def check_dimensions(file):
+    try:
+        width, height = Image.open(file).size
+    except (OSError, SyntaxError):
+        # Пусть ошибку формата сообщит ImageField.
+        width = height = 0
+    finally:
+        file.seek(0)
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(f'{width}x{height}')
+
+
+def get_storage():
+    return Recipes._meta.get_field('image').storage
+
+
+def referenced_images(names):
+    """Какие из файлов names ещё использует хотя бы один рецепт."""
+    condition = Q()
+    for field in IMAGE_FIELDS:
+        condition |= Q(**{f'{field}__in': names})
+    used = set()
+    for row in Recipes.objects.filter(condition).values_list(*IMAGE_FIELDS):
+        used.update(row)
+    return used & set(names)
+
+
+def is_fresh(storage, name):
+    """Файл недавно загружен или переиспользован: на него может
+    сослаться ещё не закоммиченная транзакция."""
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except (OSError, NotImplementedError):
+        return True
+    return time.time() - modified < settings.MEDIA_GC_GRACE
+
+
+def delete_unreferenced(names):
+    storage = get_storage()
+    names = set(names)
+    for name in names - referenced_images(names):
+        if not is_fresh(storage, name):
+            storage.delete(name)
+
+
+def release_images(names):
+    """Удаляет файлы после коммита, если ссылок на них не осталось.
+
+    Ссылками служат сами строки Recipes: один файл могут использовать
+    несколько рецептов, если им загрузили одинаковые картинки.
+    Файлы моложе MEDIA_GC_GRACE остаются до команды gcmedia.
+    """
+    names = {name for name in names if name}
+    if names:
+        transaction.on_commit(lambda: delete_unreferenced(names))
+
+
+def variant_name(image_name, variant):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = VARIANT_EXTENSIONS[settings.IMAGE_VARIANT_FORMAT]
+    return f'recipes/images/variants/{stem}_{variant}.{extension}'
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size)
+    if settings.IMAGE_VARIANT_FORMAT == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = io.BytesIO()
+    variant.save(
+        buffer, settings.IMAGE_VARIANT_FORMAT,
+        quality=settings.IMAGE_VARIANT_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(recipe_id, image_name):
+    """Строит уменьшенные копии картинки рецепта и сохраняет их пути."""
+    storage = get_storage()
+    with storage.open(image_name) as source:
+        image = Image.open(source)
+        image.load()
+    names = {}
+    for variant, field in VARIANT_FIELDS.items():
+        names[field] = storage.save(
+            variant_name(image_name, variant),
+            render_variant(image, settings.IMAGE_VARIANTS[variant]))
+    # Картинку могли заменить, пока строились варианты.
+    if not Recipes.objects.filter(
+            pk=recipe_id, image=image_name).update(**names):
+        release_images(names.values())
+
+
+def _generate_in_background(recipe_id, image_name):
+    try:
+        generate_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Не удалось построить варианты картинки %s', image_name)
+    finally:
+        # У рабочего потока своё соединение с БД.
+        connection.close()
+
+
+def schedule_variants(recipe):
+    """Ставит построение вариантов в очередь после коммита транзакции."""
+    if not recipe.image:
+        return
+    stale = {
+        field: getattr(recipe, field).name
+        for field in VARIANT_FIELDS.values()
+        if getattr(recipe, field)
+    }
+    if stale:
+        # Старые варианты относятся к прежней картинке.
+        Recipes.objects.filter(pk=recipe.pk).update(
+            **{field: '' for field in stale})
+        for field in stale:
+            setattr(recipe, field, '')
+        release_images(stale.values())
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if settings.IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor(
+            'recipe-images', settings.IMAGE_WORKERS
+        ).submit(_generate_in_background, recipe_id, image_name))
+    else:
+        transaction.on_commit(
+            lambda: generate_variants(recipe_id, image_name))
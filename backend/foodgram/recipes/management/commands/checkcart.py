@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.cart import find_mismatches, rebuild_totals
+
+
+class Command(BaseCommand):
+    """Сверяет сводные списки покупок с корзинами и рецептами."""
+    help = 'Проверяет согласованность сводных списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать списки пользователей с расхождениями.')
+
+    def handle(self, *args, **options):
+        mismatches = find_mismatches()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        self.stdout.write(
+            'Расхождения у пользователей: '
+            + ', '.join(map(str, mismatches)))
+        if not options['fix']:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        rebuild_totals(mismatches)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено пользователей: {len(mismatches)}'))
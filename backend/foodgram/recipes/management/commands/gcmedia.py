@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand
+from recipes.images import IMAGE_FIELDS, get_storage, is_fresh
+from recipes.models import Recipes
+
+MEDIA_DIRS = ('recipes/images',)
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    """Удаляет картинки рецептов, на которые не ссылается ни один рецепт.
+
+    Файлы моложе MEDIA_GC_GRACE пропускаются: их могла только что
+    загрузить ещё не закоммиченная транзакция.
+    """
+    help = 'Удаляет неиспользуемые файлы картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать, что будет удалено, ничего не удаляя')
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        referenced = set()
+        for row in Recipes.objects.values_list(*IMAGE_FIELDS).iterator():
+            referenced.update(row)
+        deleted = freed = 0
+        for path in MEDIA_DIRS:
+            if not storage.exists(path):
+                continue
+            for name in walk(storage, path):
+                if name in referenced or is_fresh(storage, name):
+                    continue
+                deleted += 1
+                freed += storage.size(name)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'- {name}')
+                if not options['dry_run']:
+                    storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Будет удалено' if options['dry_run'] else 'Удалено'} "
+            f'файлов: {deleted}, {freed / 1024 / 1024:.1f} МБ'
+        ))
@@ -0,0 +1,68 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Ingredients
+from recipes.synthetic import PASSWORD, generate
+
+
+class Command(BaseCommand):
+    """Заполняет БД синтетическими данными для нагрузочных проверок.
+
+    Ингредиенты берутся из data/ingredients.csv (через importcsv),
+    остальное генерируется: степенное распределение авторов, избранного
+    и подписок, корзины у четверти пользователей. Данные пишутся
+    bulk_create в обход сигналов, производные таблицы заполняются
+    в конце.
+    """
+    help = 'Генерирует пользователей, рецепты, избранное, подписки и корзины.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument(
+            '--users', type=int,
+            help='Число пользователей (по умолчанию recipes / 10)')
+        parser.add_argument(
+            '--per-user', type=int, default=20,
+            help='Избранного, покупок и подписок на пользователя')
+        parser.add_argument(
+            '--per-recipe', type=int, default=8,
+            help='Ингредиентов в рецепте')
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора; задаёт и префикс логинов')
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Файл ингредиентов для importcsv')
+        parser.add_argument(
+            '--synthetic-ingredients', action='store_true',
+            help='Не загружать файл, сгенерировать ингредиенты')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        ingredients_ids = None
+        if not options['synthetic_ingredients']:
+            call_command('importcsv', options['ingredients'], verbosity=0)
+            ingredients_ids = list(
+                Ingredients.objects.values_list('id', flat=True))
+
+        def progress(message):
+            self.stdout.write(
+                f'[{time.monotonic() - started:7.1f}s] {message}')
+
+        with transaction.atomic():
+            counts = generate(
+                recipes=options['recipes'], users=options['users'],
+                tags=options['tags'], per_recipe=options['per_recipe'],
+                per_user=options['per_user'], seed=options['seed'],
+                ingredients_ids=ingredients_ids, progress=progress)
+        for table, count in counts.items():
+            self.stdout.write(f'{table}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {time.monotonic() - started:.0f} с; логины "
+            f"synthetic-{options['seed']}-<n>, пароль {PASSWORD}"))
@@ -1,19 +1,123 @@
 import csv
+import json
 import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from recipes.models import Ingredients
+from recipes.signals import ingredients_imported
+
+
+def read_csv(fin):
+    yield from csv.DictReader(fin)
+
+
+def read_json(fin, chunk_size=64 * 1024):
+    """Построчно разбирает JSON-массив объектов, читая файл кусками."""
+    decoder = json.JSONDecoder()
+    buffer = fin.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = fin.read(chunk_size)
+            if not chunk:
+                raise CommandError('Файл JSON обрывается')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
 
 
 class Command(BaseCommand):
-    """Обработчик менеджмент-команды по импорту csv-данных в БД."""
+    """Обработчик менеджмент-команды по импорту csv-данных в БД.
+
+    Импорт идемпотентен: ингредиенты сопоставляются по паре
+    (name, measurement_unit), новые добавляются пачками, существующие
+    не трогаются, поэтому связи с рецептами сохраняются. Других полей
+    у ингредиента нет, так что обновлять нечего: строка либо
+    добавляется, либо остаётся без изменений.
+    """
+    help = 'Загружает ингредиенты из data/ingredients.csv или .json.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Файл .csv или .json (по умолчанию data/ingredients.csv)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать, что будет добавлено, ничего не записывая')
+
     def handle(self, *args, **options):
-        Ingredients.objects.all().delete()
-        with open(os.path.join("data", "ingredients.csv"), 'r', encoding='utf-8') as fin:
-            dr = csv.DictReader(fin)
-            to_db = [Ingredients(
-                name=i['name'],
-                measurement_unit=i['measurement_unit']
-            ) for i in dr]
-
-        Ingredients.objects.bulk_create(to_db)
+        reader = READERS.get(os.path.splitext(options['path'])[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        stats = {'inserted': 0, 'unchanged': 0, 'skipped': 0}
+        seen = set()
+        with open(options['path'], encoding='utf-8') as fin:
+            rows = reader(fin)
+            batch = list(islice(rows, options['batch_size']))
+            while batch:
+                self.import_batch(batch, seen, stats, options['dry_run'])
+                batch = list(islice(rows, options['batch_size']))
+        if stats['inserted'] and not options['dry_run']:
+            ingredients_imported.send(sender=self.__class__)
+        elapsed = time.monotonic() - started
+        total = sum(stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Будет добавлено' if options['dry_run'] else 'Добавлено'}: "
+            f"{stats['inserted']}, без изменений: {stats['unchanged']}, "
+            f"пропущено: {stats['skipped']}; "
+            f"{total / elapsed if elapsed else 0:.0f} строк/с"
+        ))
+
+    def import_batch(self, batch, seen, stats, dry_run):
+        keys = []
+        for row in batch:
+            try:
+                key = (row['name'].strip(), row['measurement_unit'].strip())
+            except (KeyError, AttributeError, TypeError):
+                stats['skipped'] += 1
+                continue
+            if not all(key) or key in seen:
+                stats['skipped'] += 1
+                continue
+            seen.add(key)
+            keys.append(key)
+        names = {name for name, _ in keys}
+        existing = set(Ingredients.objects.filter(
+            name__in=names).values_list('name', 'measurement_unit'))
+        new = [key for key in keys if key not in existing]
+        if dry_run:
+            stats['unchanged'] += len(keys) - len(new)
+            stats['inserted'] += len(new)
+            if self.verbosity > 1:
+                for name, unit in new:
+                    self.stdout.write(f'+ {name} ({unit})')
+            return
+        Ingredients.objects.bulk_create(
+            (Ingredients(name=name, measurement_unit=unit)
+             for name, unit in new),
+            ignore_conflicts=True
+        )
+        # ignore_conflicts не сообщает, сколько строк вставлено, поэтому
+        # число берётся из базы: строки с этими названиями до и после.
+        inserted = Ingredients.objects.filter(
+            name__in=names).count() - len(existing)
+        stats['inserted'] += inserted
+        stats['unchanged'] += len(keys) - inserted
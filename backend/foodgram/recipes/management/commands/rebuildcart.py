@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recipes.cart import rebuild_totals
+
+
+class Command(BaseCommand):
+    """Пересобирает сводные списки покупок из корзин и рецептов."""
+    help = 'Пересобирает сводные списки покупок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='users',
+            help='id пользователей; по умолчанию - все.')
+
+    def handle(self, *args, **options):
+        rows = rebuild_totals(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводные списки пересобраны, строк: {rows}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    """Исправляет расхождения денормализованных счётчиков."""
+    help = 'Сверяет и исправляет счётчики избранного, покупок и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(fix=not options['dry_run'])
+        for field, count in drift.items():
+            self.stdout.write(f'{field}: расхождений {count}')
@@ -0,0 +1,179 @@
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import IngredientsRecipes
+from .search import InMemoryIndex
+
+logger = logging.getLogger(__name__)
+
+
+def load_ingredients(recipes_ids):
+    """{id рецепта: frozenset id ингредиентов}."""
+    by_recipe = {}
+    for recipe_id, ingredient_id in IngredientsRecipes.objects.filter(
+            recipes_id__in=recipes_ids).values_list(
+                'recipes_id', 'ingredients_id'):
+        by_recipe.setdefault(recipe_id, set()).add(ingredient_id)
+    return {pk: frozenset(ids) for pk, ids in by_recipe.items()}
+
+
+def grow(totals, size):
+    """Дополняет массив нулями до длины size."""
+    if len(totals) < size:
+        totals.frombytes(bytes(totals.itemsize * (size - len(totals))))
+
+
+# Массивы рецептов не меняются на месте, их могут читать другие
+# потоки: добавление и удаление возвращают копию.
+def with_recipe(posting, recipe_id):
+    position = bisect_left(posting, recipe_id)
+    if position < len(posting) and posting[position] == recipe_id:
+        return posting
+    return posting[:position] + array('I', [recipe_id]) + posting[position:]
+
+
+def without_recipe(posting, recipe_id):
+    position = bisect_left(posting, recipe_id)
+    if position == len(posting) or posting[position] != recipe_id:
+        return posting
+    return posting[:position] + posting[position + 1:]
+
+
+class IngredientMatchIndex(InMemoryIndex):
+    """Обратный индекс «ингредиент -> рецепты» для подбора рецептов
+    по продуктам пользователя.
+
+    Хранит для каждого ингредиента array('I') id рецептов по
+    возрастанию и array('H') с числом ингредиентов рецепта по его id.
+    После записи рецепта индекс обновляется точечно (update). По
+    истечении RECIPE_MATCH_INDEX_TTL индекс перестраивается в фоновом
+    потоке, запросы до подмены читают прежний.
+    """
+    ttl_setting = 'RECIPE_MATCH_INDEX_TTL'
+
+    def __init__(self):
+        super().__init__()
+        # Обновления, пришедшие во время фоновой перестройки; None -
+        # перестройка не идёт.
+        self._pending = None
+
+    def _build(self):
+        postings = {}
+        totals = array('H')
+        for recipe_id, ingredient_id in IngredientsRecipes.objects.order_by(
+                'recipes_id').values_list(
+                    'recipes_id', 'ingredients_id').iterator():
+            postings.setdefault(ingredient_id, array('I')).append(recipe_id)
+            grow(totals, recipe_id + 1)
+            totals[recipe_id] += 1
+        return postings, totals
+
+    def _snapshot(self):
+        index = self._index
+        if index is None:
+            return super()._snapshot()
+        if self._is_stale():
+            self._rebuild_in_background()
+        return index
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = []
+        threading.Thread(
+            target=self._rebuild, name='match-index', daemon=True).start()
+
+    def _rebuild(self):
+        index = None
+        try:
+            index = self._build()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс подбора')
+        finally:
+            # У фонового потока своё соединение с БД.
+            connection.close()
+        with self._lock:
+            if index is not None:
+                for change in self._pending:
+                    self._apply(index, *change)
+                self._index = index
+            # После ошибки следующая попытка - через тот же TTL.
+            self._built_at = time.monotonic()
+            self._pending = None
+
+    def update(self, recipes_ids, removed=()):
+        """Переносит в индекс текущий состав рецептов recipes_ids.
+
+        removed - пары (рецепт, ингредиент), удалённые из БД: по ним
+        рецепт убирается из списков ингредиентов, которых у него больше
+        нет.
+        """
+        if self._index is None:
+            return
+        change = (recipes_ids, removed, load_ingredients(recipes_ids))
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            if self._index is not None:
+                self._apply(self._index, *change)
+
+    @staticmethod
+    def _apply(index, recipes_ids, removed, current):
+        postings, totals = index
+        for recipe_id, ingredient_id in removed:
+            if (ingredient_id in postings
+                    and ingredient_id not in current.get(recipe_id, ())):
+                postings[ingredient_id] = without_recipe(
+                    postings[ingredient_id], recipe_id)
+        for recipe_id in recipes_ids:
+            ingredients = current.get(recipe_id, frozenset())
+            for ingredient_id in ingredients:
+                postings[ingredient_id] = with_recipe(
+                    postings.get(ingredient_id, array('I')), recipe_id)
+            grow(totals, recipe_id + 1)
+            totals[recipe_id] = len(ingredients)
+
+    def match(self, ingredients_ids, max_missing=0, limit=None):
+        """Рецепты, которым не хватает не больше max_missing
+        ингредиентов: [(id, есть, всего)] по убыванию доли имеющихся."""
+        postings, totals = self._snapshot()
+        have = Counter()
+        for ingredient_id in set(ingredients_ids):
+            have.update(postings.get(ingredient_id, ()))
+        found = []
+        size = len(totals)
+        for recipe_id, count in have.items():
+            total = totals[recipe_id] if recipe_id < size else 0
+            if total and total - count <= max_missing:
+                found.append((recipe_id, count, total))
+
+        def rank(item):
+            recipe_id, count, total = item
+            return -count / total, total - count, -recipe_id
+
+        if limit is None:
+            return sorted(found, key=rank)
+        return heapq.nsmallest(limit, found, key=rank)
+
+
+match_index = IngredientMatchIndex()
+
+
+def update_match_index(recipes_ids, removed=()):
+    """Обновляет индекс после коммита транзакции."""
+    recipes_ids, removed = set(recipes_ids), list(removed)
+    transaction.on_commit(lambda: match_index.update(recipes_ids, removed))
+
+
+def match_recipes(ingredients_ids, max_missing=0):
+    return match_index.match(
+        ingredients_ids, max_missing, settings.RECIPE_MATCH_MAX_RESULTS)
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_cart_ingredients(apps, schema_editor):
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingCartIngredients = apps.get_model(
+        'recipes', 'ShoppingCartIngredients')
+    rows = ShoppingCart.objects.filter(
+        recipes__ingredientsrecipes__isnull=False
+    ).values_list(
+        'user_id', 'recipes__ingredientsrecipes__ingredients_id'
+    ).annotate(
+        total=Sum('recipes__ingredientsrecipes__amount')
+    ).order_by()
+    ShoppingCartIngredients.objects.bulk_create((
+        ShoppingCartIngredients(
+            user_id=user_id, ingredients_id=ingredients_id, amount=total)
+        for user_id, ingredients_id, total in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_auto_20230107_1457'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartIngredients',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredients', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredients', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Ингредиенты в списках покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredients',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredients'), name='unique_cart_ingredient'),
+        ),
+        migrations.RunPython(
+            fill_cart_ingredients, migrations.RunPython.noop),
+    ]
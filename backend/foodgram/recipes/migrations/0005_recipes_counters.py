@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipes', 'favorites_count', 'recipes', 'Favorites', 'recipes'),
+    ('recipes', 'Recipes', 'cart_count', 'recipes', 'ShoppingCart', 'recipes'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipes', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Subscription', 'following'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, name, field, source_app, source_name, fk in COUNTERS:
+        source = apps.get_model(source_app, source_name)
+        apps.get_model(app, name).objects.update(**{field: Coalesce(
+            Subquery(
+                source.objects.filter(**{fk: OuterRef('pk')}).order_by()
+                .values(fk).annotate(total=Count('pk')).values('total')
+            ),
+            Value(0),
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredients_name_trgm'),
+        ('users', '0006_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:26
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения,
+    перенося ссылки рецептов и списков покупок на оставшуюся запись."""
+    Ingredients = apps.get_model('recipes', 'Ingredients')
+    IngredientsRecipes = apps.get_model('recipes', 'IngredientsRecipes')
+    ShoppingCartIngredients = apps.get_model(
+        'recipes', 'ShoppingCartIngredients')
+    groups = Ingredients.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in groups:
+        keep = group['keep']
+        extra = list(Ingredients.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=keep).values_list('id', flat=True))
+        for model, owner in ((IngredientsRecipes, 'recipes_id'),
+                             (ShoppingCartIngredients, 'user_id')):
+            for row in model.objects.filter(ingredients_id__in=extra):
+                target = model.objects.filter(
+                    **{owner: getattr(row, owner)}, ingredients_id=keep
+                ).first()
+                if target is None:
+                    row.ingredients_id = keep
+                    row.save()
+                    continue
+                target.amount += row.amount
+                target.save()
+                row.delete()
+        Ingredients.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipes_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredients',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_unit'),
+        ),
+    ]
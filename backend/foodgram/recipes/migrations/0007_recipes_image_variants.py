@@ -0,0 +1,28 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_ingredients_unique_name_unit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='image_card',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/images/variants/', verbose_name='Картинка для карточки'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='image_full',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/images/variants/', verbose_name='Картинка для страницы рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/images/variants/', verbose_name='Миниатюра'),
+        ),
+    ]
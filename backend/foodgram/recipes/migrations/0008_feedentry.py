@@ -0,0 +1,64 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    Recipes = apps.get_model('recipes', 'Recipes')
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    followers = Subscription.objects.filter(
+        following__followers_count__lte=settings.FEED_PUSH_MAX_FOLLOWERS
+    ).values_list('user_id', flat=True).distinct().order_by()
+    for user_id in followers.iterator():
+        recipes = Recipes.objects.filter(
+            author__following__user_id=user_id,
+            author__followers_count__lte=settings.FEED_PUSH_MAX_FOLLOWERS,
+        ).order_by('-pub_date', '-id').values_list(
+            'pk', 'author_id', 'pub_date')[:settings.FEED_MAX_LENGTH]
+        FeedEntry.objects.bulk_create(
+            FeedEntry(user_id=user_id, recipes_id=pk,
+                      author_id=author_id, pub_date=pub_date)
+            for pk, author_id, pub_date in recipes
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_recipes_image_variants'),
+        ('users', '0006_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipes', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipes', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи лент',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipes'], name='feed_user_pub_date'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipes'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
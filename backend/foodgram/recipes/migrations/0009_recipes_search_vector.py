@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = '''
+UPDATE recipes_recipes AS r SET search_vector =
+    setweight(to_tsvector(%s::regconfig, r.name), 'A')
+    || setweight(to_tsvector(%s::regconfig, coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientsrecipes AS ir
+        JOIN recipes_ingredients AS i ON i.id = ir.ingredients_id
+        WHERE ir.recipes_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%s::regconfig, r.text), 'C')
+'''
+
+
+def create_search_vector(apps, schema_editor):
+    # Колонка не описана в модели: её ведёт recipes/search.py, а на
+    # других БД поиск обслуживает индекс в памяти процесса.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE recipes_recipes '
+        'ADD COLUMN IF NOT EXISTS search_vector tsvector'
+    )
+    schema_editor.execute(
+        SEARCH_VECTOR_SQL, [settings.RECIPE_SEARCH_CONFIG] * 3)
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_recipes_search_vector '
+        'ON recipes_recipes USING gin (search_vector)'
+    )
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE recipes_recipes DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
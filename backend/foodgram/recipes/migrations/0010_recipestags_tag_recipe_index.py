@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipes_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipestags',
+            index=models.Index(fields=['tags', 'recipes'], name='recipes_tags_tag_recipe'),
+        ),
+    ]
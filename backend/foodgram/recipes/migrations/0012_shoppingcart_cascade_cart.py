@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+import recipes.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0011_hot_relation_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='recipes',
+            field=models.ForeignKey(db_index=False, on_delete=recipes.models.cascade_cart, related_name='shopping', to='recipes.recipes', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=recipes.models.cascade_cart, related_name='customer', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+    ]
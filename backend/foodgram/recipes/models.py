@@ -35,6 +35,12 @@ class Ingredients(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_ingredient_unit',
+                fields=['name', 'measurement_unit'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -51,18 +57,31 @@ class Recipes(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
-        auto_now_add=True,
-        db_index=True
+        auto_now_add=True
     )
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='recipes/images/',
         help_text='Загрузите фото к рецепту'
     )
+    # Уменьшенные копии картинки строятся в фоне (см. recipes/images.py).
+    image_thumbnail = models.ImageField(
+        'Миниатюра', upload_to='recipes/images/variants/',
+        blank=True, editable=False
+    )
+    image_card = models.ImageField(
+        'Картинка для карточки', upload_to='recipes/images/variants/',
+        blank=True, editable=False
+    )
+    image_full = models.ImageField(
+        'Картинка для страницы рецепта',
+        upload_to='recipes/images/variants/', blank=True, editable=False
+    )
     text = models.TextField(
         max_length=2000,
         verbose_name='Рецепт',
@@ -81,11 +100,28 @@ class Recipes(models.Model):
         through_fields=('recipes', 'ingredients'),
         verbose_name='Ингредиенты'
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        # Одиночные индексы по author и pub_date заменены составными.
+        indexes = [
+            models.Index(
+                name='recipes_pub_date_id',
+                fields=['-pub_date', '-id'],
+            ),
+            models.Index(
+                name='recipes_author_pub_date',
+                fields=['author', '-pub_date'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -107,6 +143,12 @@ class RecipesTags(models.Model):
                 fields=['recipes', 'tags'],
             ),
         ]
+        indexes = [
+            models.Index(
+                name='recipes_tags_tag_recipe',
+                fields=['tags', 'recipes'],
+            ),
+        ]
 
 
 class IngredientsRecipes(models.Model):
@@ -139,12 +181,14 @@ class Favorites(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='favorite',
-        verbose_name='Пользователь'
+        verbose_name='Пользователь',
+        db_index=False
     )
     recipes = models.ForeignKey(
         Recipes, on_delete=models.CASCADE,
         related_name='favorites',
-        verbose_name='Рецепт'
+        verbose_name='Рецепт',
+        db_index=False
     )
 
     class Meta:
@@ -156,19 +200,41 @@ class Favorites(models.Model):
                 fields=['user', 'recipes'],
             ),
         ]
+        # Поиск по пользователю обслуживает unique_favorites, по рецепту -
+        # обратный составной индекс.
+        indexes = [
+            models.Index(
+                name='favorites_recipe_user',
+                fields=['recipes', 'user'],
+            ),
+        ]
+
+
+def cascade_cart(collector, field, sub_objs, using):
+    """CASCADE для строк корзины с пометкой каскадного удаления.
+
+    Сводный список покупок при этом не пересчитывается по строкам:
+    при удалении рецепта это делается одним запросом (recipe_deleted),
+    при удалении пользователя список удаляется вместе с ним.
+    """
+    for cart in sub_objs:
+        cart.cascaded = True
+    models.CASCADE(collector, field, sub_objs, using)
 
 
 class ShoppingCart(models.Model):
     """Модель добавления рецептов в список покупок"""
     user = models.ForeignKey(
-        User, on_delete=models.CASCADE,
+        User, on_delete=cascade_cart,
         related_name='customer',
-        verbose_name='Пользователь'
+        verbose_name='Пользователь',
+        db_index=False
     )
     recipes = models.ForeignKey(
-        Recipes, on_delete=models.CASCADE,
+        Recipes, on_delete=cascade_cart,
         related_name='shopping',
-        verbose_name='Рецепт'
+        verbose_name='Рецепт',
+        db_index=False
     )
 
     class Meta:
@@ -180,3 +246,84 @@ class ShoppingCart(models.Model):
                 fields=['user', 'recipes'],
             ),
         ]
+        # Поиск по пользователю обслуживает unique_shopping, по рецепту -
+        # обратный составной индекс.
+        indexes = [
+            models.Index(
+                name='shopping_recipe_user',
+                fields=['recipes', 'user'],
+            ),
+        ]
+
+
+class ShoppingCartIngredients(models.Model):
+    """Сводный список покупок пользователя по ингредиентам.
+
+    Поддерживается инкрементально при изменении корзины и рецептов,
+    см. recipes/cart.py.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredients = models.ForeignKey(
+        Ingredients, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_cart_ingredient',
+                fields=['user', 'ingredients'],
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика.
+
+    Записи добавляются при публикации рецепта всем подписчикам автора,
+    см. recipes/feed.py.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipes = models.ForeignKey(
+        Recipes, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_feed_entry',
+                fields=['user', 'recipes'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='feed_user_pub_date',
+                fields=['user', '-pub_date', '-recipes'],
+            ),
+            models.Index(
+                name='feed_user_author',
+                fields=['user', 'author'],
+            ),
+        ]
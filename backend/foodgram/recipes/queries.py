@@ -0,0 +1,17 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Recipes
+
+
+def latest_recipes(authors_ids, limit):
+    """Последние limit рецептов каждого из авторов одним запросом:
+    отбор по ROW_NUMBER() в разрезе автора."""
+    authors_ids = list(authors_ids)
+    if not authors_ids or limit < 1:
+        return Recipes.objects.none()
+    return Recipes.objects.filter(author_id__in=authors_ids).annotate(
+        position=Window(
+            RowNumber(), partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()))
+    ).filter(position__lte=limit).order_by('-pub_date', '-id')
@@ -0,0 +1,289 @@
+import html
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, FloatField, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Ingredients, IngredientsRecipes, Recipes
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+class InMemoryIndex:
+    """Индекс в памяти процесса, который строится при первом обращении.
+
+    Перестраивается после invalidate() (сигналы) или по истечении
+    ttl_setting секунд, чтобы подхватывать изменения из других процессов.
+    """
+    ttl_setting = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._index = None
+
+    def _is_stale(self):
+        return (
+            self._index is None
+            or time.monotonic() - self._built_at
+            >= getattr(settings, self.ttl_setting)
+        )
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _snapshot(self):
+        index = self._index
+        if index is None or self._is_stale():
+            with self._lock:
+                index = self._index
+                if index is None or self._is_stale():
+                    index = self._build()
+                    self._index = index
+                    self._built_at = time.monotonic()
+        return index
+
+
+class IngredientIndex(InMemoryIndex):
+    """Индекс ингредиентов для автодополнения (INGREDIENT_INDEX_TTL)."""
+    ttl_setting = 'INGREDIENT_INDEX_TTL'
+
+    def _build(self):
+        entries = sorted((
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in Ingredients.objects.order_by().values_list(
+                'id', 'name', 'measurement_unit')
+        ), key=lambda entry: (entry['name'].lower(), entry['id']))
+        keys = [entry['name'].lower() for entry in entries]
+        offsets = []
+        offset = 0
+        for key in keys:
+            offsets.append(offset)
+            offset += len(key) + 1
+        return (
+            keys,
+            entries,
+            sorted(entries, key=lambda entry: entry['id']),
+            # Все названия одной строкой: поиск подстроки идёт через
+            # str.find без цикла по названиям на Python.
+            '\n'.join(keys),
+            offsets,
+        )
+
+    def all(self):
+        return self._snapshot()[2]
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по началу названия, затем по подстроке."""
+        keys, entries, _, text, offsets = self._snapshot()
+        query = query.strip().lower()
+        found = []
+        start = bisect_left(keys, query)
+        position = start
+        while position < len(keys) and keys[position].startswith(query):
+            found.append(entries[position])
+            if limit is not None and len(found) >= limit:
+                return found
+            position += 1
+        contains = []
+        found_at = text.find(query)
+        while found_at != -1:
+            index = bisect_right(offsets, found_at) - 1
+            if not start <= index < position:
+                contains.append((found_at - offsets[index], index))
+            if index + 1 == len(offsets):
+                break
+            found_at = text.find(query, offsets[index + 1])
+        contains.sort()
+        found.extend(entries[index] for _, index in contains)
+        return found[:limit]
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients_in_db(query, limit=None):
+    """Тот же поиск средствами БД (на PostgreSQL его обслуживает
+    триграммный индекс по названию)."""
+    queryset = Ingredients.objects.filter(
+        name__icontains=query
+    ).annotate(
+        rank=Case(
+            When(name__istartswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    ).order_by('rank', 'name').values('id', 'name', 'measurement_unit')
+    return list(queryset[:limit])
+
+
+def search_ingredients(query, limit=None):
+    """Поиск для автодополнения; без запроса - все ингредиенты по id."""
+    if settings.INGREDIENT_INDEX_ENABLED:
+        if not query.strip():
+            return ingredient_index.all()
+        return ingredient_index.search(query, limit)
+    if not query.strip():
+        return list(Ingredients.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit'))
+    return search_ingredients_in_db(query.strip(), limit)
+
+
+# Веса полей рецепта: как у ts_rank для весов A, B и C.
+FIELD_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+
+SEARCH_VECTOR_SQL = '''
+UPDATE recipes_recipes AS r SET search_vector =
+    setweight(to_tsvector(%s::regconfig, r.name), 'A')
+    || setweight(to_tsvector(%s::regconfig, coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientsrecipes AS ir
+        JOIN recipes_ingredients AS i ON i.id = ir.ingredients_id
+        WHERE ir.recipes_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%s::regconfig, r.text), 'C')
+WHERE r.id IN ({placeholders})
+'''
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def uses_search_vector():
+    return connection.vendor == 'postgresql'
+
+
+class RecipeIndex(InMemoryIndex):
+    """Обратный индекс рецептов для БД без полнотекстового поиска.
+
+    Ищет по началу слов названия, ингредиентов и описания; все слова
+    запроса должны встретиться в рецепте.
+    """
+    ttl_setting = 'RECIPE_INDEX_TTL'
+
+    def _build(self):
+        postings = {}
+
+        def add(recipe_id, text, weight):
+            for token in tokenize(text):
+                scores = postings.setdefault(token, {})
+                scores[recipe_id] = scores.get(recipe_id, 0) + weight
+
+        for pk, name, text in Recipes.objects.order_by().values_list(
+                'id', 'name', 'text').iterator():
+            add(pk, name, FIELD_WEIGHTS['name'])
+            add(pk, text, FIELD_WEIGHTS['text'])
+        for pk, name in IngredientsRecipes.objects.order_by().values_list(
+                'recipes_id', 'ingredients__name').iterator():
+            add(pk, name, FIELD_WEIGHTS['ingredients'])
+        return sorted(postings), postings
+
+    def search(self, query, limit=None):
+        """[(id, релевантность)] по убыванию релевантности."""
+        terms, postings = self._snapshot()
+        found = None
+        for word in set(tokenize(query)):
+            scores = {}
+            position = bisect_left(terms, word)
+            while position < len(terms) and terms[position].startswith(word):
+                for pk, score in postings[terms[position]].items():
+                    scores[pk] = scores.get(pk, 0) + score
+                position += 1
+            if found is None:
+                found = scores
+            else:
+                found = {
+                    pk: score + scores[pk]
+                    for pk, score in found.items() if pk in scores
+                }
+            if not found:
+                return []
+        return sorted(
+            (found or {}).items(), key=lambda item: (-item[1], -item[0])
+        )[:limit]
+
+
+recipe_index = RecipeIndex()
+
+
+def index_recipes(recipes_ids):
+    """Пересчитывает search_vector рецептов (только PostgreSQL)."""
+    recipes_ids = list(recipes_ids)
+    if not recipes_ids or not uses_search_vector():
+        return
+    config = settings.RECIPE_SEARCH_CONFIG
+    with connection.cursor() as cursor:
+        for start in range(0, len(recipes_ids), 1000):
+            chunk = recipes_ids[start:start + 1000]
+            cursor.execute(
+                SEARCH_VECTOR_SQL.format(
+                    placeholders=', '.join(['%s'] * len(chunk))),
+                [config, config, config, *chunk]
+            )
+
+
+def recipes_changed(recipes_ids):
+    """Обновляет поисковые индексы после коммита транзакции."""
+    recipe_index.invalidate()
+    recipes_ids = set(recipes_ids)
+    transaction.on_commit(lambda: index_recipes(recipes_ids))
+
+
+def search_recipes(queryset, query):
+    """Отбирает рецепты по запросу и сортирует по релевантности
+    (поле search_rank)."""
+    if uses_search_vector():
+        tsquery = 'plainto_tsquery(%s::regconfig, %s)'
+        params = [settings.RECIPE_SEARCH_CONFIG, query]
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT id FROM recipes_recipes '
+            f'WHERE search_vector @@ {tsquery}', params
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank(recipes_recipes.search_vector, {tsquery})', params
+        )).order_by('-search_rank', '-pub_date', '-id')
+    found = recipe_index.search(query, settings.RECIPE_SEARCH_MAX_RESULTS)
+    return queryset.filter(pk__in=[pk for pk, _ in found]).annotate(
+        search_rank=Case(
+            *(When(pk=pk, then=Value(score)) for pk, score in found),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
+
+
+def highlight(text, query, length=None):
+    """Экранирует text и выделяет слова запроса тегом <mark>.
+
+    С length возвращает фрагмент такой длины вокруг первого совпадения.
+    """
+    words = tuple(set(tokenize(query)))
+    matches = [
+        match for match in TOKEN_RE.finditer(text)
+        if words and match.group().lower().startswith(words)
+    ]
+    start, end = 0, len(text)
+    if length is not None and len(text) > length:
+        first = matches[0].start() if matches else 0
+        start = max(0, min(first - length // 4, len(text) - length))
+        end = start + length
+    parts = ['…'] if start else []
+    position = start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(html.escape(text[position:end]))
+    if end < len(text):
+        parts.append('…')
+    return ''.join(parts)
@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+from users.models import Subscription, User
+
+from .cart import recipe_added, recipe_deleted
+from .counters import COUNTERS, change_counter
+from .feed import backfill, fan_out, resume_push, schedule, unfollow
+from .images import IMAGE_FIELDS, release_images
+from .matching import update_match_index
+from .models import Ingredients, IngredientsRecipes, Recipes, ShoppingCart
+from .search import ingredient_index, recipe_index, recipes_changed
+
+# Массовая загрузка ингредиентов в обход post_save (importcsv).
+ingredients_imported = Signal()
+
+
+def connect_counter(model, field, source, fk):
+    """Поддерживает счётчик field модели model по строкам source."""
+    attname = source._meta.get_field(fk).attname
+
+    def created(sender, instance, created, **kwargs):
+        if created:
+            change_counter(model, getattr(instance, attname), field, 1)
+
+    def deleted(sender, instance, **kwargs):
+        change_counter(model, getattr(instance, attname), field, -1)
+
+    post_save.connect(created, sender=source, weak=False,
+                      dispatch_uid=f'{field}_created')
+    post_delete.connect(deleted, sender=source, weak=False,
+                        dispatch_uid=f'{field}_deleted')
+
+
+# Счётчики подключаются раньше остальных обработчиков: рассылка по
+# лентам ниже смотрит на followers_count.
+for counter in COUNTERS:
+    connect_counter(*counter)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(sender, instance, created, **kwargs):
+    if created:
+        recipe_added(instance.user_id, instance.recipes_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    if not getattr(instance, 'cascaded', False):
+        recipe_added(instance.user_id, instance.recipes_id, sign=-1)
+
+
+@receiver(pre_delete, sender=Recipes)
+def recipe_deleted_from_carts(sender, instance, **kwargs):
+    # pre_delete: ингредиенты рецепта и строки корзин ещё не удалены.
+    recipe_deleted(instance.pk)
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+@receiver(ingredients_imported)
+def ingredients_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredients)
+def ingredient_renamed(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        recipes_changed(IngredientsRecipes.objects.filter(
+            ingredients=instance).values_list('recipes_id', flat=True))
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_save, sender=IngredientsRecipes)
+@receiver(post_delete, sender=IngredientsRecipes)
+def recipe_content_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        recipes_ids = [getattr(instance, 'recipes_id', instance.pk)]
+        recipes_changed(recipes_ids)
+        removed = ()
+        if kwargs['signal'] is post_delete:
+            removed = [(instance.recipes_id, instance.ingredients_id)]
+        update_match_index(recipes_ids, removed)
+
+
+@receiver(post_delete, sender=Recipes)
+def recipe_removed(sender, instance, **kwargs):
+    recipe_index.invalidate()
+    update_match_index([instance.pk])
+
+
+@receiver(pre_save, sender=Recipes)
+def recipe_images_replaced(sender, instance, raw, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old = Recipes.objects.filter(pk=instance.pk).values_list(
+        *IMAGE_FIELDS).first()
+    if old:
+        current = {getattr(instance, field).name for field in IMAGE_FIELDS}
+        release_images(set(old) - current)
+
+
+@receiver(post_delete, sender=Recipes)
+def recipe_images_deleted(sender, instance, **kwargs):
+    release_images(getattr(instance, field).name for field in IMAGE_FIELDS)
+
+
+@receiver(post_save, sender=Recipes)
+def recipe_published(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        schedule(fan_out, [instance])
+
+
+@receiver(post_save, sender=Subscription)
+def subscribed(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        schedule(backfill, instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def unsubscribed(sender, instance, **kwargs):
+    unfollow(instance.user_id, instance.following_id)
+    if User.objects.filter(
+            pk=instance.following_id,
+            followers_count=settings.FEED_PUSH_MAX_FOLLOWERS).exists():
+        schedule(resume_push, instance.following_id)
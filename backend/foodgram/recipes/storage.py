@@ -0,0 +1,38 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по SHA-256 содержимого.
+
+    Файл recipes/images/temp.png сохраняется как
+    recipes/images/ab/abcdef....png. Одинаковые загрузки попадают в один
+    файл, а содержимое файла по одному адресу никогда не меняется,
+    поэтому nginx может отдавать такие файлы с бессрочным кешем.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Свежая дата изменения защищает переиспользованный файл
+            # от удаления, пока ссылка на него не закоммичена.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
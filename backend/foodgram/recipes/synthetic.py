@@ -0,0 +1,229 @@
+import hashlib
+import random
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from users.models import Subscription, User
+
+from .cart import rebuild_totals
+from .counters import reconcile_counters
+from .matching import match_index
+from .models import (Favorites, FeedEntry, Ingredients, IngredientsRecipes,
+                     Recipes, RecipesTags, ShoppingCart, Tags)
+from .search import index_recipes, recipe_index
+
+BATCH_SIZE = 5000
+PASSWORD = 'synthetic'
+
+
+def chunks(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def bulk_create(model, objects):
+    """bulk_create пачками: генератор не разворачивается в память
+    целиком."""
+    for chunk in chunks(objects):
+        model.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def power_law(size, exponent=1.0):
+    """Накопленные веса степенного распределения для rng.choices."""
+    return list(accumulate(1 / (n + 1) ** exponent for n in range(size)))
+
+
+def tag_colors(prefix, count):
+    """Цвета, которых ещё нет в БД, выведенные из префикса.
+
+    Tags.color уникален, а bulk_create(ignore_conflicts=True) молча
+    отбросил бы теги с цветом реальных тегов или прошлых запусков.
+    """
+    used = set(Tags.objects.values_list('color', flat=True))
+    colors = []
+    attempt = 0
+    while len(colors) < count:
+        digest = hashlib.sha256(f'{prefix}{attempt}'.encode()).hexdigest()
+        attempt += 1
+        color = f'#{digest[:6]}'
+        if color not in used:
+            used.add(color)
+            colors.append(color)
+    return colors
+
+
+def generate(recipes=10_000, users=None, ingredients=None, tags=8,
+             per_recipe=8, per_user=20, seed=0, ingredients_ids=None,
+             progress=None):
+    """Заполняет БД синтетическими данными в пропорциях продакшена.
+
+    Пишет всё bulk_create в обход сигналов: счётчики, ленты, сводные
+    списки покупок и поисковые индексы заполняются здесь же напрямую.
+    Пользователи получают логины synthetic-<seed>-<n> и пароль
+    PASSWORD; повторный запуск с тем же seed дублирует рецепты. Если
+    передан ingredients_ids, рецепты собираются из этих ингредиентов
+    вместо синтетических. progress(str) вызывается после каждого этапа.
+    Возвращает число строк в таблицах.
+    """
+    progress = progress or (lambda message: None)
+    rng = random.Random(seed)
+    users = users or max(recipes // 10, 10)
+    prefix = f'synthetic-{seed}-'
+
+    # Пароль у всех одинаковый, поэтому хеш считается один раз.
+    password = make_password(PASSWORD)
+    bulk_create(User, (
+        User(username=f'{prefix}{n}', email=f'{prefix}{n}@example.com',
+             first_name='Synthetic', last_name=str(n), password=password)
+        for n in range(users)
+    ))
+    users_ids = list(User.objects.filter(
+        username__startswith=prefix).order_by('pk').values_list(
+            'id', flat=True))
+    progress(f'Пользователи: {len(users_ids)}')
+
+    bulk_create(Tags, (
+        Tags(name=f'{prefix}{n}', slug=f'{prefix}{n}', color=color)
+        for n, color in enumerate(tag_colors(prefix, tags))
+    ))
+    tags_ids = list(Tags.objects.filter(
+        slug__startswith=prefix).values_list('id', flat=True))
+    if not tags_ids:
+        raise ValueError(f'Не удалось создать теги {prefix}<n>')
+    if ingredients_ids is None:
+        ingredients = ingredients or min(max(recipes // 10, 50), 2000)
+        bulk_create(Ingredients, (
+            Ingredients(name=f'{prefix}{n}', measurement_unit='г')
+            for n in range(ingredients)
+        ))
+        ingredients_ids = list(Ingredients.objects.filter(
+            name__startswith=prefix).values_list('id', flat=True))
+    ingredients_ids = list(ingredients_ids)
+
+    # Активность авторов и популярность рецептов неравномерны:
+    # степенное распределение вместо равномерного.
+    authors_weights = power_law(len(users_ids))
+    recipes_ids = []
+    for start in range(0, recipes, BATCH_SIZE):
+        recipes_ids.extend(create_recipes(
+            rng, prefix, range(start, min(start + BATCH_SIZE, recipes)),
+            rng.choices(users_ids, cum_weights=authors_weights,
+                        k=min(BATCH_SIZE, recipes - start)),
+            tags_ids, ingredients_ids, per_recipe))
+        progress(f'Рецепты: {len(recipes_ids)}')
+
+    popularity = power_law(len(recipes_ids), 0.8)
+
+    def pick(model, user):
+        return (
+            model(user_id=user, recipes_id=pk)
+            for pk in set(rng.choices(
+                recipes_ids, cum_weights=popularity, k=per_user))
+        )
+
+    bulk_create(Favorites, (
+        favorite for user in users_ids for favorite in pick(Favorites, user)
+    ))
+    bulk_create(ShoppingCart, (
+        item for user in users_ids if rng.random() < 0.25
+        for item in pick(ShoppingCart, user)
+    ))
+    bulk_create(Subscription, (
+        Subscription(user_id=user, following_id=author)
+        for user in users_ids
+        for author in set(rng.choices(
+            users_ids, cum_weights=authors_weights, k=per_user))
+        if author != user
+    ))
+    progress('Избранное, корзины и подписки')
+    fill_derived(users_ids)
+    progress('Счётчики, ленты и списки покупок')
+    return {
+        model.__name__: model.objects.count() for model in (
+            User, Tags, Ingredients, Recipes, RecipesTags,
+            IngredientsRecipes, Favorites, ShoppingCart, Subscription,
+            FeedEntry)
+    }
+
+
+def create_recipes(rng, prefix, numbers, authors, tags_ids,
+                   ingredients_ids, per_recipe):
+    """Пачка рецептов с тегами и ингредиентами; возвращает их id."""
+    last = Recipes.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+    Recipes.objects.bulk_create(
+        Recipes(author_id=author, name=f'{prefix}recipe {n}',
+                text=f'Синтетический рецепт {n}',
+                cooking_time=rng.randint(1, 180),
+                image='recipes/images/synthetic.png')
+        for n, author in zip(numbers, authors)
+    )
+    recipes_ids = list(Recipes.objects.filter(
+        pk__gt=last, name__startswith=prefix).values_list('pk', flat=True))
+    # pub_date заполняется auto_now_add, поэтому разносится отдельно.
+    now = timezone.now()
+    Recipes.objects.bulk_update([
+        Recipes(pk=pk, pub_date=now - timedelta(
+            minutes=rng.randint(0, 365 * 24 * 60)))
+        for pk in recipes_ids
+    ], ['pub_date'], batch_size=BATCH_SIZE)
+    bulk_create(RecipesTags, (
+        RecipesTags(recipes_id=pk, tags_id=tag)
+        for pk in recipes_ids
+        for tag in rng.sample(tags_ids, rng.randint(1, min(3, len(tags_ids))))
+    ))
+    bulk_create(IngredientsRecipes, (
+        IngredientsRecipes(recipes_id=pk, ingredients_id=ingredient,
+                           amount=rng.randint(1, 500))
+        for pk in recipes_ids
+        for ingredient in rng.sample(
+            ingredients_ids, min(per_recipe, len(ingredients_ids)))
+    ))
+    index_recipes(recipes_ids)
+    return recipes_ids
+
+
+def fill_derived(users_ids):
+    """Счётчики, ленты и сводные списки покупок для созданных строк."""
+    reconcile_counters(fix=True)
+    for user_id in users_ids:
+        bulk_create(FeedEntry, (
+            FeedEntry(user_id=user_id, recipes_id=pk,
+                      author_id=author_id, pub_date=pub_date)
+            for pk, author_id, pub_date in Recipes.objects.filter(
+                author__following__user_id=user_id,
+                author__followers_count__lte=(
+                    settings.FEED_PUSH_MAX_FOLLOWERS),
+            ).order_by('-pub_date', '-id').values_list(
+                'pk', 'author_id', 'pub_date')[:settings.FEED_MAX_LENGTH]
+        ))
+    # Списки id ограничены, чтобы не упереться в лимит параметров SQL.
+    for chunk in chunks(users_ids, 500):
+        rebuild_totals(chunk)
+    recipe_index.invalidate()
+    match_index.invalidate()
+
+
+def pick_fixtures():
+    """Типичные объекты для проверок: активный пользователь (подписки,
+    избранное и корзина), популярные автор и рецепт, тег. None, если
+    данных нет."""
+    user = User.objects.filter(
+        follower__isnull=False, favorite__isnull=False,
+        customer__isnull=False).first()
+    recipe = Recipes.objects.order_by('-favorites_count').first()
+    tag = Tags.objects.filter(recipes__isnull=False).first()
+    if user is None or recipe is None or tag is None:
+        return None
+    return {
+        'user': user,
+        'author': User.objects.order_by('-followers_count').first(),
+        'recipe': recipe,
+        'tag': tag,
+    }
@@ -5,7 +5,7 @@ from .models import Subscription, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('email', 'username')
+    list_display = ('email', 'username', 'recipes_count', 'followers_count')
     list_filter = ('email', 'username')
 
 
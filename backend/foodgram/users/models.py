@@ -15,6 +15,17 @@ class User(AbstractUser):
         verbose_name='Подписки',
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+    cart_version = models.PositiveIntegerField(
+        'Версия списка покупок',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.username
@@ -30,12 +41,14 @@ class Subscription(models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False
     )
     following = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='following',
-        verbose_name='Подписан'
+        verbose_name='Подписан',
+        db_index=False
     )
 
     class Meta:
@@ -47,6 +60,14 @@ class Subscription(models.Model):
                 fields=['user', 'following'],
             ),
         ]
+        # Подписки пользователя ищутся по unique_subscription, подписчики
+        # автора - по обратному индексу.
+        indexes = [
+            models.Index(
+                name='subscription_following_user',
+                fields=['following', 'user'],
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан  на {self.following}'